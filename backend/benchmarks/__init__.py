@@ -0,0 +1,42 @@
+"""
+Scripts reproducing the figures quoted in commit messages, run from the
+backend directory, e.g.
+
+    DJANGO_SETTINGS_MODULE=eventhub.test_settings python -m benchmarks.event_views --views 5000
+
+Each creates a test database, like `manage.py test` does, and drops it at
+the end, so the configured database is never written to. Numbers depend on
+the database behind DATABASE_URL, SQLite unless it's set.
+"""
+import argparse
+import time
+
+import django
+
+
+def run(main, **defaults):
+    """
+    Call `main` with the script's arguments, `--name` options defaulting to
+    `defaults`, inside a throwaway test database.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    for name, default in defaults.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    arguments = parser.parse_args()
+
+    django.setup()
+    from django.test.utils import setup_databases, teardown_databases
+
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        main(**vars(arguments))
+    finally:
+        teardown_databases(databases, verbosity=0)
+
+
+def timed(func, repeat=1):
+    """Seconds per call of `func` over `repeat` calls, and the last call's result."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
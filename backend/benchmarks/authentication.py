@@ -0,0 +1,32 @@
+"""
+Read-only requests authenticated by CachedJWTAuthentication against plain
+simplejwt JWTAuthentication, which loads the user on every request.
+"""
+from benchmarks import run, timed
+
+
+def main(requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+    from user.authentication import CachedJWTAuthentication
+    from user.models import User
+    from user.views import UserViewset
+
+    user = User.objects.create_user(email="ada@example.com", password=None, username="ada", first_name="Ada", last_name="Obi")
+    request = APIRequestFactory().get("/users/me/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    for name, authentication in (("cached", CachedJWTAuthentication), ("simplejwt", JWTAuthentication)):
+        # no throttles, so the figures are only the authentication's
+        me = UserViewset.as_view({"get": "me"}, authentication_classes=[authentication], throttle_classes=[])
+        me(request)
+        with CaptureQueriesContext(connection) as queries:
+            response = me(request)
+        seconds, _ = timed(lambda: me(request), requests)
+        print(f"{name:10} {response.status_code} {len(queries)} queries per request, {1 / seconds:,.0f} req/s")
+
+
+if __name__ == "__main__":
+    run(main, requests=2000)
@@ -0,0 +1,36 @@
+"""Event view ingestion: one INSERT per view against the buffered, batched writes of core.tracking."""
+import datetime
+
+from benchmarks import run, timed
+
+
+def main(views):
+    from core.models import Event, EventView
+    from core.tracking import get_event_view_buffer
+    from user.models import User
+
+    organizer = User.objects.create_user(email="organizer@example.com", password=None, username="organizer", first_name="Ada", last_name="Obi")
+    event = Event.objects.create(
+        title="Benchmark", date=datetime.date.today(), description="d", short_description="s",
+        organizer=organizer, city="Lagos", country="NG", slot=10,
+    )
+
+    def per_request():
+        for index in range(views):
+            EventView.objects.create(event=event, visitor_id=f"direct-{index}", user_agent="benchmark", ip_address="10.0.0.1")
+
+    buffer = get_event_view_buffer()
+
+    def buffered():
+        for index in range(views):
+            buffer.record(event.pk, f"buffered-{index}", None, "benchmark", "10.0.0.1")
+        buffer.flush()
+
+    direct_seconds, _ = timed(per_request)
+    buffered_seconds, _ = timed(buffered)
+    print(f"{views} views: {views / direct_seconds:,.0f}/s with one INSERT each, {views / buffered_seconds:,.0f}/s buffered")
+    print(f"rows written: {EventView.objects.count()} (expected {2 * views})")
+
+
+if __name__ == "__main__":
+    run(main, views=5000)
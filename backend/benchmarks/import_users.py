@@ -0,0 +1,42 @@
+"""
+user.onboarding.import_users, which bulk-creates users and their
+preferences per chunk, against create_user one row at a time, and how
+fast a re-import skips rows that already exist.
+"""
+from benchmarks import run, timed
+
+
+def rows(prefix, count, passwords=0):
+    """`count` CSV-like rows, the first `passwords` of them with a password."""
+    return [
+        dict(
+            email=f"{prefix}{index}@example.com", username=f"{prefix}{index}", first_name="Ada", last_name="Obi",
+            password=f"Secret-pass-{index}" if index < passwords else "",
+        )
+        for index in range(count)
+    ]
+
+
+def main(users, baseline_users, passwords, chunk_size):
+    from user.models import User
+    from user.onboarding import import_users
+
+    def one_at_a_time():
+        for row in rows("single", baseline_users):
+            User.objects.create_user(
+                email=row["email"], username=row["username"], first_name=row["first_name"], last_name=row["last_name"], password=None,
+            )
+
+    seconds, _ = timed(one_at_a_time)
+    print(f"create_user    {baseline_users:7} users in {seconds:6.1f} s, {baseline_users / seconds:7,.0f}/s")
+
+    imported = rows("bulk", users, passwords)
+    seconds, counts = timed(lambda: import_users(iter(imported), chunk_size=chunk_size))
+    print(f"import_users   {counts['created']:7} users in {seconds:6.1f} s, {counts['created'] / seconds:7,.0f}/s, {passwords} with a password")
+
+    seconds, counts = timed(lambda: import_users(iter(imported), chunk_size=chunk_size))
+    print(f"re-import      {counts['existing']:7} skipped in {seconds:6.1f} s, {counts['created']} created")
+
+
+if __name__ == "__main__":
+    run(main, users=100_000, baseline_users=5000, passwords=0, chunk_size=1000)
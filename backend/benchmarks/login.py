@@ -0,0 +1,67 @@
+"""
+Login throughput and latency with password hashing bounded to
+PASSWORD_HASHING_CONCURRENCY slots, see user.hashing, against letting
+every request hash at once, with --clients logging in concurrently.
+"""
+import threading
+import time
+
+from benchmarks import run, timed
+
+PASSWORD = "Secret-pass-1"
+
+
+def main(clients, logins, hashers):
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory
+    from user import hashing
+    from user.models import User
+    from user.views import TokenObtainPairView
+
+    # no throttles, so every login gets as far as checking the password
+    login = TokenObtainPairView.as_view(throttle_classes=[])
+    factory = APIRequestFactory()
+
+    def log_in(index, latencies, statuses):
+        try:
+            for _ in range(logins):
+                request = factory.post("/token/", dict(email=f"user{index}@example.com", password=PASSWORD), format="json")
+                start = time.perf_counter()
+                response = login(request)
+                latencies.append(time.perf_counter() - start)
+                statuses.add(response.status_code)
+        finally:
+            connection.close()
+
+    for hasher in hashers.split(","):
+        for name, concurrency in (("bounded", None), ("unbounded", clients)):
+            # afresh every run, logging in upgrades older hashes to the first of PASSWORD_HASHERS
+            User.objects.all().delete()
+            User.objects.bulk_create([
+                User(email=f"user{index}@example.com", username=f"user{index}", first_name="Ada", last_name="Obi", password=make_password(PASSWORD, hasher=hasher))
+                for index in range(clients)
+            ])
+            latencies, statuses = [], set()
+            with override_settings(PASSWORD_HASHING_CONCURRENCY=concurrency, PASSWORD_HASHING_TIMEOUT=60):
+                hashing._slots = None
+                threads = [threading.Thread(target=log_in, args=(index, latencies, statuses)) for index in range(clients)]
+
+                def all_clients():
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+
+                seconds, _ = timed(all_clients)
+            hashing._slots = None
+            latencies.sort()
+            print(
+                f"{hasher:14} {name:9} {len(latencies) / seconds:6.1f} logins/s, p50 {latencies[len(latencies) // 2] * 1000:5.0f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:5.0f} ms, statuses {sorted(statuses)}"
+            )
+
+
+if __name__ == "__main__":
+    run(main, clients=32, logins=4, hashers="argon2,pbkdf2_sha256")
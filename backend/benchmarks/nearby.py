@@ -0,0 +1,61 @@
+"""
+/events/nearby/ over the geohash cells and bounding box against computing
+the distance to every event, with the two checked to return the same events.
+"""
+import datetime
+import random
+
+from benchmarks import run, timed
+
+# (lat, lng, radius_km): a dense city, the same city wider, a sparse region, both sides of the antimeridian
+SEARCHES = [(6.5, 3.4, 10), (6.5, 3.4, 50), (51.5, -0.1, 300), (0.0, 179.9, 200), (-50.0, -179.5, 400)]
+
+
+def main(events, repeat):
+    from django.utils import timezone
+    from rest_framework.test import APIRequestFactory
+    from core.models import Event
+    from core.views import EventViewset
+    from user.models import User
+    from utilities.geo import distance_expression, encode_geohash
+
+    random.seed(1)
+    organizer = User.objects.create_user(email="organizer@example.com", password=None, username="organizer", first_name="Ada", last_name="Obi")
+    today = timezone.localdate()
+
+    def event(index, lat, lng):
+        return Event(
+            title=f"Event {index}", date=today + datetime.timedelta(days=index % 60), description="d", short_description="s",
+            organizer=organizer, city="Lagos", country="NG", slot=10, latitude=lat, longitude=lng, geohash=encode_geohash(lat, lng),
+        )
+
+    # spread over the inhabited latitudes, with a fiftieth of them packed into one city
+    cluster = events // 50
+    rows = [event(index, random.uniform(-60, 70), random.uniform(-180, 180)) for index in range(events - cluster)]
+    rows += [event(index, 6.5 + random.uniform(-0.3, 0.3), 3.4 + random.uniform(-0.3, 0.3)) for index in range(cluster)]
+    Event.objects.bulk_create(rows, batch_size=2000)
+
+    nearby = EventViewset.as_view({"get": "nearby"})
+    factory = APIRequestFactory()
+    for lat, lng, radius_km in SEARCHES:
+        request = factory.get("/events/nearby/", dict(lat=lat, lng=lng, radius_km=radius_km, limit=200))
+        indexed_seconds, response = timed(lambda: nearby(request), repeat)
+
+        full_scan = (
+            Event.objects.filter(date__gte=today)
+            .annotate(distance_km=distance_expression(lat, lng))
+            .filter(distance_km__lte=radius_km)
+            .order_by("distance_km", "date", "id")
+        )
+        scan_seconds, expected = timed(lambda: list(full_scan.values_list("id", flat=True)[:200]), repeat)
+
+        found = [result["id"] for result in response.data["results"]]
+        same = found == [str(pk) for pk in expected]
+        print(
+            f"({lat:6.1f}, {lng:6.1f}) {radius_km:4} km: {len(found):3} events, "
+            f"nearby {indexed_seconds * 1000:7.1f} ms, full scan {scan_seconds * 1000:7.1f} ms, same results: {same}"
+        )
+
+
+if __name__ == "__main__":
+    run(main, events=100_000, repeat=10)
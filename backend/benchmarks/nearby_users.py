@@ -0,0 +1,75 @@
+"""
+user.notifications.nearby_users, which reads the users in the geohash cells
+around a new event, against reading every user's preference and checking the
+distance in Python, with the two checked to find the same users.
+"""
+import math
+import random
+
+from benchmarks import run, timed
+
+CITIES = [(6.5, 3.4), (51.5, -0.1), (40.7, -74.0), (35.7, 139.7), (-33.9, 151.2), (-1.3, 36.8), (19.1, 72.9)]
+# a city, the antimeridian, and a point whose circle takes in the north pole
+EVENTS = [(6.45, 3.39), (0.0, 179.9), (87.5, 60.0)]
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    from utilities.geo import EARTH_RADIUS_KM
+
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def location():
+    """Most users around a handful of cities, the rest anywhere, a few of them in the Arctic."""
+    draw = random.random()
+    if draw < 0.6:
+        lat, lng = random.choice(CITIES)
+        lat, lng = lat + random.gauss(0, 2), lng + random.gauss(0, 2)
+    elif draw < 0.99:
+        lat, lng = random.uniform(-60, 70), random.uniform(-180, 180)
+    else:
+        lat, lng = random.uniform(80, 90), random.uniform(-180, 180)
+    return max(-90.0, min(90.0, lat)), (lng + 180) % 360 - 180
+
+
+def main(users, batch_size):
+    from django.db import connection
+    from user.models import User, UserPreference
+    from user.notifications import nearby_users
+    from utilities.geo import encode_geohash
+
+    random.seed(3)
+    for start in range(0, users, batch_size):
+        created = User.objects.bulk_create([
+            User(email=f"user{index}@example.com", username=f"user{index}", first_name="Ada", last_name="Obi", password="!")
+            for index in range(start, min(start + batch_size, users))
+        ])
+        preferences = []
+        for user in created:
+            lat, lng = location()
+            preferences.append(UserPreference(
+                user=user, latitude=lat, longitude=lng, geohash=encode_geohash(lat, lng),
+                notify_radius_km=random.choice([10, 25, 50, 100, 250, 500]),
+            ))
+        UserPreference.objects.bulk_create(preferences)
+    if connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def scan(lat, lng):
+        preferences = UserPreference.objects.values_list("user_id", "latitude", "longitude", "notify_radius_km").iterator(chunk_size=batch_size)
+        return {user_id for user_id, a, b, radius_km in preferences if a is not None and haversine(lat, lng, a, b) <= radius_km}
+
+    for lat, lng in EVENTS:
+        indexed_seconds, found = timed(lambda: set(nearby_users(lat, lng)))
+        scan_seconds, expected = timed(lambda: scan(lat, lng))
+        print(
+            f"({lat:5.2f}, {lng:6.2f}): {len(found):6} users, nearby_users {indexed_seconds * 1000:7.0f} ms, "
+            f"scan {scan_seconds * 1000:7.0f} ms, same users: {found == expected}"
+        )
+
+
+if __name__ == "__main__":
+    run(main, users=200_000, batch_size=5000)
@@ -0,0 +1,67 @@
+"""
+Insert rate and table/index size of an EventView-shaped table keyed by the
+old random varchar(300) UUID strings against the time-ordered UUIDv7 keys
+of utilities.utils.generate_uuid.
+"""
+import random
+import uuid
+
+from benchmarks import run, timed
+
+EVENTS = 100
+
+
+def table_sizes(connection, table):
+    """Bytes of (table, indexes), None where the database can't tell."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_relation_size(%s), pg_indexes_size(%s)", [table, table])
+            return cursor.fetchone()
+        if connection.vendor == "sqlite":
+            # dbstat needs SQLITE_ENABLE_DBSTAT_VTAB, which the usual builds have
+            cursor.execute(
+                "SELECT name = %s, SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = %s) GROUP BY name = %s",
+                [table, table, table],
+            )
+            sizes = dict(cursor.fetchall())
+            return sizes.get(1, 0), sizes.get(0, 0)
+    return None, None
+
+
+def main(rows, batch_size):
+    from django.db import connection, transaction
+    from core.models import EventView
+    from utilities.utils import generate_uuid
+
+    pk = EventView._meta.pk
+    layouts = [
+        ("before", "varchar(300)", lambda: str(uuid.uuid4())),
+        ("after", connection.data_types["UUIDField"], lambda: pk.get_db_prep_value(generate_uuid(), connection)),
+    ]
+
+    for name, column_type, new_key in layouts:
+        table = f"benchmark_event_view_{name}"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {table} (id {column_type} PRIMARY KEY, event_id {column_type} NOT NULL, "
+                "visitor_id varchar(200), ip_address varchar(30) NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX {table}_event_id ON {table} (event_id)")
+        events = [new_key() for _ in range(EVENTS)]
+        insert = f"INSERT INTO {table} (id, event_id, visitor_id, ip_address) VALUES (%s, %s, %s, %s)"
+
+        def fill():
+            for start in range(0, rows, batch_size):
+                batch = [(new_key(), random.choice(events), f"visitor-{start + index}", "10.0.0.1") for index in range(min(batch_size, rows - start))]
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(insert, batch)
+
+        seconds, _ = timed(fill)
+        table_bytes, index_bytes = table_sizes(connection, table)
+        sizes = "sizes n/a" if table_bytes is None else f"table {table_bytes / 1e6:.1f} MB, indexes {index_bytes / 1e6:.1f} MB"
+        print(f"{name:6} {column_type:12} {rows / seconds:10,.0f} rows/s  {sizes}")
+
+
+if __name__ == "__main__":
+    run(main, rows=1_000_000, batch_size=10_000)
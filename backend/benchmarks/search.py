@@ -0,0 +1,69 @@
+"""
+Event search over the EventSearchTerm index against the `icontains` filters
+it replaced, with every result checked to contain each word of the query.
+"""
+import datetime
+import random
+
+from benchmarks import run, timed
+
+WORDS = (
+    "music jazz concert festival tech conference python django startup summit art gallery food market yoga "
+    "wellness film screening charity run marathon workshop design photography comedy night book club gaming "
+    "esports networking career fair dance party football league"
+).split()
+# a common word, two words, a prefix, a rare word from the long tail, one that matches nothing
+QUERIES = ["jazz", "python django", "django conf", "marathon run charity", "gal", "w1234", "zzzz"]
+
+
+def icontains(query):
+    from django.db.models import Q
+    from core.models import Event
+
+    condition = Q()
+    for word in query.split():
+        condition &= Q(title__icontains=word) | Q(short_description__icontains=word) | Q(description__icontains=word)
+    # ordered by a column, like ranking it has to read every match before returning the first 20
+    return list(Event.objects.filter(condition).order_by("title")[:20])
+
+
+def matches(event, query):
+    from core.search import query_terms, tokenize
+
+    tokens = tokenize(f"{event.title} {event.short_description} {event.description}")
+    words, last = query_terms(query)
+    return all(word in tokens for word in words) and any(token.startswith(last) for token in tokens)
+
+
+def main(events, repeat):
+    from core import search
+    from core.models import Event, EventSearchTerm
+    from user.models import User
+
+    random.seed(2)
+    filler = [f"w{index}" for index in range(3000)]
+    organizer = User.objects.create_user(email="organizer@example.com", password=None, username="organizer", first_name="Ada", last_name="Obi")
+    Event.objects.bulk_create([
+        Event(
+            title=" ".join(random.sample(WORDS, 3)), short_description=" ".join(random.sample(WORDS, 5)),
+            description=" ".join(random.choices(filler + WORDS, k=120)), date=datetime.date.today(),
+            organizer=organizer, city="Lagos", country="NG", slot=10,
+        )
+        for _ in range(events)
+    ], batch_size=2000)
+
+    seconds, indexed = timed(search.rebuild)
+    print(f"indexed {indexed} events, {EventSearchTerm.objects.count()} terms, in {seconds:.1f} s")
+
+    for query in QUERIES:
+        search_seconds, results = timed(lambda: search.search(query), repeat)
+        icontains_seconds, _ = timed(lambda: icontains(query), repeat)
+        correct = all(matches(event, query) for event, _ in results)
+        print(
+            f"{query!r:24} {len(results):2} results, search {search_seconds * 1000:7.1f} ms, "
+            f"icontains {icontains_seconds * 1000:7.1f} ms, all match: {correct}"
+        )
+
+
+if __name__ == "__main__":
+    run(main, events=100_000, repeat=5)
@@ -0,0 +1,132 @@
+"""
+Server-Sent Events streams driven in-process through the ASGI application:
+memory per idle event stream, publish to delivery latency across all of
+them, and notification fan_out to open user streams.
+"""
+import asyncio
+import datetime
+import time
+
+from benchmarks import run
+
+
+def rss():
+    """Resident memory of this process in bytes, Linux only."""
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS"))
+
+
+class Connection:
+    """One client of `application`, holding the request open until close()."""
+
+    def __init__(self, application, path, query=""):
+        self.status = None
+        self.chunks = []
+        self.received = asyncio.Event()
+        self.disconnected = asyncio.get_running_loop().create_future()
+        self.requested = False
+        scope = dict(
+            type="http", asgi={"version": "3.0"}, http_version="1.1", method="GET", scheme="http",
+            path=path, raw_path=path.encode(), query_string=query.encode(), root_path="",
+            headers=[(b"host", b"testserver")], client=("127.0.0.1", 1234), server=("testserver", 80),
+        )
+        self.task = asyncio.ensure_future(application(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return await self.disconnected
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message.get("body"):
+            self.chunks.append((time.perf_counter(), message["body"].decode()))
+            self.received.set()
+
+    async def wait_for(self, count):
+        while len(self.chunks) < count:
+            self.received.clear()
+            await self.received.wait()
+
+    def close(self):
+        self.disconnected.set_result({"type": "http.disconnect"})
+
+
+def delivered_after(connections, index, start):
+    """Milliseconds from `start` until the last of `connections` got its `index`th chunk."""
+    return 1000 * (max(connection.chunks[index][0] for connection in connections) - start)
+
+
+def main(event_streams, user_streams, publishes):
+    from django.core.asgi import get_asgi_application
+    from django.db import connection
+    from django.urls import reverse
+    from core.models import Event
+    from core.streams import event_channel
+    from user.models import User
+    from user.notifications import fan_out
+    from user.streams import issue_ticket
+    from utilities.choices import NotificationType
+    from utilities.pubsub import get_broker
+
+    organizer = User.objects.create_user(email="organizer@example.com", password=None, username="organizer", first_name="Ada", last_name="Obi")
+    event = Event.objects.create(
+        title="Benchmark", date=datetime.date.today() + datetime.timedelta(days=30), description="d", short_description="s",
+        organizer=organizer, city="Lagos", country="NG", slot=100_000,
+    )
+    users = User.objects.bulk_create([
+        User(email=f"user{index}@example.com", username=f"user{index}", first_name="Ada", last_name="Obi", password="!")
+        for index in range(user_streams)
+    ])
+    # the way browsers open the stream, one ticket each, see user.streams
+    tickets = [issue_ticket(user.pk) for user in users]
+    application = get_asgi_application()
+    broker = get_broker()
+
+    async def streams():
+        before = rss()
+        start = time.perf_counter()
+        event_connections = [Connection(application, reverse("event-stream", args=[event.pk])) for _ in range(event_streams)]
+        await asyncio.gather(*(client.wait_for(1) for client in event_connections))
+        print(
+            f"{event_streams} event streams open in {time.perf_counter() - start:.2f} s, "
+            f"statuses {sorted({client.status for client in event_connections})}, "
+            f"{(rss() - before) / event_streams / 1024:.0f} KiB RSS each"
+        )
+
+        latencies = []
+        for index in range(publishes):
+            start = time.perf_counter()
+            await asyncio.to_thread(broker.publish, event_channel(event.pk), dict(event="capacity", data=dict(index=index)))
+            await asyncio.gather(*(client.wait_for(index + 2) for client in event_connections))
+            latencies.append(delivered_after(event_connections, index + 1, start))
+        print(f"publish to all {event_streams} delivered in {', '.join(f'{latency:.0f}' for latency in latencies)} ms")
+
+        user_connections = [Connection(application, reverse("notification_stream"), f"ticket={ticket}") for ticket in tickets]
+        await asyncio.gather(*(client.wait_for(1) for client in user_connections))
+
+        def notify():
+            try:
+                return fan_out([user.pk for user in users], NotificationType.NEW_EVENT_NEARBY, dict(message="Jazz night near you"))
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        notified = await asyncio.to_thread(notify)
+        await asyncio.gather(*(client.wait_for(2) for client in user_connections))
+        print(
+            f"{user_streams} user streams open, statuses {sorted({client.status for client in user_connections})}, "
+            f"fan_out of {notified} delivered to all in {delivered_after(user_connections, 1, start):.0f} ms"
+        )
+
+        for client in event_connections + user_connections:
+            client.close()
+        await asyncio.gather(*(client.task for client in event_connections + user_connections))
+
+    asyncio.run(streams())
+
+
+if __name__ == "__main__":
+    run(main, event_streams=2000, user_streams=500, publishes=5)
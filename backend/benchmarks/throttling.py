@@ -0,0 +1,55 @@
+"""
+Cost of a throttle check with the sliding window counters of
+utilities.throttling against DRF's AnonRateThrottle, which keeps every
+request timestamp of the window in one cache entry, and how many of a burst
+of concurrent requests each lets through.
+"""
+import threading
+
+from benchmarks import run, timed
+
+
+class View:
+    action = "create"
+    throttle_scopes = {"create": "benchmark"}
+    throttle_scope = "benchmark"
+
+
+def main(checks, burst, limit):
+    from django.core.cache import cache
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import AnonRateThrottle
+    from utilities.throttling import UserRateThrottle
+
+    def request(address):
+        request = Request(APIRequestFactory().post("/", REMOTE_ADDR=address))
+        request._user = None
+        return request
+
+    class DRFThrottle(AnonRateThrottle):
+        scope = "benchmark"
+        THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+
+    for name, throttle in (("sliding window", UserRateThrottle), ("DRF", DRFThrottle)):
+        # high enough that every check stays allowed and DRF's history grows to `checks` timestamps
+        api_settings.DEFAULT_THROTTLE_RATES["benchmark"] = f"{checks * 10}/min"
+        cache.clear()
+        client = request("10.0.0.1")
+        seconds, _ = timed(lambda: throttle().allow_request(client, View), checks)
+
+        api_settings.DEFAULT_THROTTLE_RATES["benchmark"] = f"{limit}/min"
+        cache.clear()
+        client = request("10.0.0.2")
+        allowed = []
+        threads = [threading.Thread(target=lambda: allowed.append(throttle().allow_request(client, View))) for _ in range(burst)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"{name:15} {seconds * 1e6:8.1f} µs/check after {checks} requests, {sum(allowed)} of a {burst} request burst allowed at {limit}/min")
+
+
+if __name__ == "__main__":
+    run(main, checks=20_000, burst=50, limit=10)
@@ -0,0 +1,158 @@
+import logging
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from utilities.choices import RollupGranularityType
+from utilities.hyperloglog import HyperLogLog
+from .models import EventRegistration, EventStatsRollup, EventView
+
+logger = logging.getLogger(__name__)
+
+TRUNCATE = {
+    RollupGranularityType.HOURLY: TruncHour,
+    RollupGranularityType.DAILY: TruncDay,
+}
+
+
+def bucket_start(moment, granularity):
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == RollupGranularityType.DAILY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def visitor_key(visitor_id, ip_address, user_agent):
+    """Views without a visitor cookie fall back to ip + user agent."""
+    return visitor_id or f"{ip_address}|{user_agent}"
+
+
+def _apply(event_id, granularity, start, views=0, registrations=0, visitors=()):
+    rollup, _ = EventStatsRollup.objects.select_for_update().get_or_create(
+        event_id=event_id, granularity=granularity, bucket_start=start,
+    )
+    rollup.views += views
+    rollup.registrations += registrations
+
+    if visitors:
+        sketch = HyperLogLog.from_bytes(rollup.visitors_sketch)
+        for visitor in visitors:
+            sketch.add(visitor)
+        rollup.visitors_sketch = sketch.to_bytes()
+
+    rollup.save(update_fields=["views", "registrations", "visitors_sketch", "updated_at"])
+
+
+def record_views(views):
+    """Fold freshly written `EventView` rows into their hourly and daily rollups."""
+    grouped = defaultdict(lambda: [0, set()])
+    for view in views:
+        visitor = visitor_key(view.visitor_id, view.ip_address, view.user_agent)
+        for granularity in RollupGranularityType.values:
+            bucket = grouped[(str(view.event_id), granularity, bucket_start(view.created_at, granularity))]
+            bucket[0] += 1
+            bucket[1].add(visitor)
+
+    # a stable lock order keeps concurrent flushes from deadlocking on rollup rows
+    with transaction.atomic():
+        for (event_id, granularity, start), (count, visitors) in sorted(grouped.items()):
+            _apply(event_id, granularity, start, views=count, visitors=visitors)
+
+
+def record_registrations(registrations):
+    grouped = defaultdict(int)
+    for registration in registrations:
+        for granularity in RollupGranularityType.values:
+            grouped[(str(registration.event_id), granularity, bucket_start(registration.created_at, granularity))] += 1
+
+    with transaction.atomic():
+        for (event_id, granularity, start), count in sorted(grouped.items()):
+            _apply(event_id, granularity, start, registrations=count)
+
+
+@transaction.atomic()
+def rebuild(since, until=None):
+    """
+    Recompute the rollups of every whole day from `since` up to `until` from
+    the raw tables, e.g. to backfill history. Views still sitting in the
+    `core.tracking` buffer are counted when they are flushed.
+    """
+    since = bucket_start(since, RollupGranularityType.DAILY)
+    until = until or timezone.now()
+
+    rollups = {}
+
+    def rollup_for(event_id, granularity, start):
+        key = (str(event_id), granularity, start)
+        if key not in rollups:
+            rollups[key] = (EventStatsRollup(event_id=event_id, granularity=granularity, bucket_start=start), HyperLogLog())
+        return rollups[key]
+
+    views = (
+        EventView.objects.filter(created_at__gte=since, created_at__lt=until)
+        .values_list("event_id", "created_at", "visitor_id", "ip_address", "user_agent")
+        .iterator(chunk_size=5000)
+    )
+    for event_id, created_at, visitor_id, ip_address, user_agent in views:
+        visitor = visitor_key(visitor_id, ip_address, user_agent)
+        for granularity in RollupGranularityType.values:
+            rollup, sketch = rollup_for(event_id, granularity, bucket_start(created_at, granularity))
+            rollup.views += 1
+            sketch.add(visitor)
+
+    for granularity, truncate in TRUNCATE.items():
+        registrations = (
+            EventRegistration.objects.filter(created_at__gte=since, created_at__lt=until)
+            .annotate(bucket=truncate("created_at", tzinfo=dt_timezone.utc))
+            .values("event_id", "bucket")
+            .annotate(total=Count("id"))
+        )
+        for row in registrations:
+            rollup, _ = rollup_for(row["event_id"], granularity, row["bucket"])
+            rollup.registrations = row["total"]
+
+    for rollup, sketch in rollups.values():
+        rollup.visitors_sketch = sketch.to_bytes()
+
+    EventStatsRollup.objects.filter(bucket_start__gte=since, bucket_start__lt=until).delete()
+    EventStatsRollup.objects.bulk_create([rollup for rollup, _ in rollups.values()], batch_size=1000)
+
+    logger.info(f"Rebuilt {len(rollups)} event stats rollup(s) since {since.isoformat()}.")
+    return len(rollups)
+
+
+def event_stats(event_id, granularity=RollupGranularityType.DAILY, since=None):
+    """Totals and per-bucket series for an event, read from rollups only."""
+    rollups = EventStatsRollup.objects.filter(event_id=event_id, granularity=granularity).only(
+        "bucket_start", "views", "registrations", "visitors_sketch"
+    )
+    if since is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(since, granularity))
+
+    visitors = HyperLogLog()
+    total_views = total_registrations = 0
+    buckets = []
+    for rollup in rollups:
+        sketch = HyperLogLog.from_bytes(rollup.visitors_sketch)
+        visitors.merge(sketch)
+        total_views += rollup.views
+        total_registrations += rollup.registrations
+        buckets.append(dict(
+            bucket_start=rollup.bucket_start,
+            views=rollup.views,
+            unique_visitors=sketch.count(),
+            registrations=rollup.registrations,
+        ))
+
+    unique_visitors = visitors.count()
+    return dict(
+        views=total_views,
+        unique_visitors=unique_visitors,
+        registrations=total_registrations,
+        conversion_rate=round(total_registrations / unique_visitors, 4) if unique_visitors else 0,
+        granularity=granularity,
+        buckets=buckets,
+    )
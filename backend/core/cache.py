@@ -0,0 +1,113 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from utilities import versioning
+from utilities.replicas import primary
+from .models import Event
+
+LIST_SCOPE = "list"
+# what registrations change on an event, left to be read fresh on cached list pages
+CAPACITY_FIELDS = ("remaining_slots",)
+
+
+def _version_key(scope):
+    return f"events:version:{scope}"
+
+
+def get_version(scope):
+    return versioning.get_version(_version_key(scope))
+
+
+def bump_version(scope):
+    versioning.bump_version(_version_key(scope))
+
+
+def event_scope(event_id):
+    return f"event:{event_id}"
+
+
+def invalidate_event(event_id):
+    """Drop the cached detail of an event and every cached list page."""
+    bump_version(event_scope(event_id))
+    bump_version(LIST_SCOPE)
+
+
+def invalidate_event_capacity(event_id):
+    """Drop the cached detail of an event whose capacity changed, list pages read capacity fresh."""
+    bump_version(event_scope(event_id))
+
+
+def canonical_event_id(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def detail_entry(event_id):
+    """Cache key and ETag of an event detail response."""
+    version = get_version(event_scope(event_id))
+    return f"events:detail:{event_id}:{version}", f'W/"event-{event_id}-{version}"'
+
+
+def list_entry(request):
+    """Cache key of an event list page, one per distinct query string, and the version it's under."""
+    version = get_version(LIST_SCOPE)
+    # the host is part of the key because pages embed absolute "next" links
+    query = "&".join(sorted(request.GET.urlencode().split("&")))
+    query = hashlib.sha1(f"{request.get_host()}?{query}".encode()).hexdigest()
+    return f"events:list:{version}:{query}", version
+
+
+def with_fresh_capacity(data):
+    """Overwrite the CAPACITY_FIELDS of a cached list page with the events' current values, in one query."""
+    results = {str(result["id"]): result for result in data["results"]}
+    for event_id, *values in Event.objects.filter(pk__in=results).values_list("id", *CAPACITY_FIELDS):
+        results[str(event_id)].update(zip(CAPACITY_FIELDS, values))
+    return data
+
+
+def cached_list_response(request, build):
+    """
+    Serve an event list page like `cached_response`, except for the
+    CAPACITY_FIELDS of the events on it, which are read fresh on a cache
+    hit. A burst of registrations then leaves the cached pages alone
+    instead of dropping every one of them. The ETag covers those fields, so
+    it costs that one query before answering 304.
+    """
+    key, version = list_entry(request)
+    data = cache.get(key)
+    if data is None:
+        with primary():
+            data = build()
+        cache.set(key, data, settings.EVENT_RESPONSE_CACHE_TIMEOUT)
+    else:
+        data = with_fresh_capacity(data)
+
+    capacity = [[result.get(field) for field in CAPACITY_FIELDS] for result in data["results"]]
+    digest = hashlib.sha1(f"{key}:{capacity}".encode()).hexdigest()
+    etag = f'W/"events-{version}-{digest[:16]}"'
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(data=data, headers={"ETag": etag})
+
+
+def cached_response(request, key, etag, build):
+    """
+    Answer 304 when the client already holds `etag`, otherwise serve the
+    cached data, calling `build` to serialize it only on a cache miss.
+    """
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    data = cache.get(key)
+    if data is None:
+        # filled from the primary, a replica lagging behind an invalidation would be cached for the whole timeout
+        with primary():
+            data = build()
+        cache.set(key, data, settings.EVENT_RESPONSE_CACHE_TIMEOUT)
+    return Response(data=data, headers={"ETag": etag})
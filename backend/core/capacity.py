@@ -0,0 +1,168 @@
+import logging
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from utilities.choices import EventRegistrationStatusType
+from .models import Event, EventRegistration
+
+logger = logging.getLogger(__name__)
+
+_cancel_signer = signing.Signer(salt="core.capacity.cancel")
+
+
+def reserve_slot(event_id):
+    """
+    Take one slot of the event, returns False when the event is full.
+
+    The check and the decrement happen in a single conditional UPDATE so
+    concurrent registrations serialize on the event row instead of racing.
+    """
+    updated = Event.objects.filter(pk=event_id, remaining_slots__gt=0).update(
+        remaining_slots=F("remaining_slots") - 1
+    )
+    return updated == 1
+
+
+def release_slot(event_id):
+    """Give a slot back to the event, never going above `Event.slot`."""
+    Event.objects.filter(pk=event_id, remaining_slots__lt=F("slot")).update(
+        remaining_slots=F("remaining_slots") + 1
+    )
+
+
+def live_registrations(event):
+    """Registrations holding or waiting for a slot, keyed for lookups by lower-cased email."""
+    return (
+        EventRegistration.objects.filter(event=event)
+        .exclude(status=EventRegistrationStatusType.CANCELLED)
+        .annotate(email_lower=Lower("email"))
+    )
+
+
+def register(serializer):
+    """
+    Save a validated `EventRegistrationCreateSerializer`, confirming the
+    registration when a slot is available and waitlisting it otherwise.
+
+    Registering an email twice for the same event is idempotent: the unique
+    index on (event, lower(email)) rejects the second insert, the slot it
+    took is rolled back with it and the existing registration is returned.
+    Returns the registration and whether it was created.
+    """
+    event = serializer.validated_data["event"]
+    try:
+        with transaction.atomic():
+            # register_many's lock: a full event's UPDATE below matches no row and locks
+            # nothing, and a bulk registration's duplicate check mustn't miss this insert
+            Event.objects.select_for_update().filter(pk=event.pk).exists()
+            if reserve_slot(event.pk):
+                status = EventRegistrationStatusType.CONFIRMED
+            else:
+                logger.info(f"Event {event.pk} is full, waitlisting registration.")
+                status = EventRegistrationStatusType.WAITLISTED
+            return serializer.save(status=status), True
+    except IntegrityError:
+        email = serializer.validated_data["email"].lower()
+        return live_registrations(event).get(email_lower=email), False
+
+
+@transaction.atomic()
+def register_many(serializer):
+    """
+    Save a validated `BulkEventRegistrationCreateSerializer` in one
+    transaction. Emails already registered for the event, or repeated in
+    the batch, are skipped; the rest are confirmed while the event has room
+    and waitlisted after that. Returns one result per submitted attendee,
+    in order, and the registrations that were created.
+    """
+    event = Event.objects.select_for_update().get(pk=serializer.validated_data["event"].pk)
+    attendees = serializer.validated_data["attendees"]
+
+    emails = {attendee["email"].lower() for attendee in attendees}
+    registered = set(live_registrations(event).filter(email_lower__in=emails).values_list("email_lower", flat=True))
+
+    new_attendees = []
+    for attendee in attendees:
+        email = attendee["email"].lower()
+        if email not in registered:
+            registered.add(email)
+            new_attendees.append(attendee)
+
+    # the event row is locked, so remaining_slots can't move under us
+    confirmed = min(event.remaining_slots, len(new_attendees))
+    if confirmed:
+        Event.objects.filter(pk=event.pk).update(remaining_slots=F("remaining_slots") - confirmed)
+
+    rows = [
+        dict(
+            attendee,
+            event=event,
+            status=EventRegistrationStatusType.CONFIRMED if index < confirmed else EventRegistrationStatusType.WAITLISTED,
+        )
+        for index, attendee in enumerate(new_attendees)
+    ]
+    registrations = serializer.fields["attendees"].create(rows)
+
+    created = {id(attendee): registration for attendee, registration in zip(new_attendees, registrations)}
+    results = []
+    for attendee in attendees:
+        registration = created.get(id(attendee))
+        results.append(dict(
+            email=attendee["email"],
+            id=registration.pk if registration else None,
+            status=registration.status if registration else "DUPLICATE",
+        ))
+    return results, registrations
+
+
+def cancel_token(registration_id):
+    """Proof of owning the registration, handed to the registrant only, `cancel` requires it."""
+    return _cancel_signer.signature(str(registration_id))
+
+
+def valid_cancel_token(registration_id, token):
+    return isinstance(token, str) and signing.constant_time_compare(token, cancel_token(registration_id))
+
+
+@transaction.atomic()
+def cancel(registration_id):
+    """Cancel a registration and hand its slot to the next waitlisted attendee."""
+    registration = EventRegistration.objects.select_for_update().get(pk=registration_id)
+
+    if registration.status == EventRegistrationStatusType.CANCELLED:
+        return registration
+
+    was_confirmed = registration.status == EventRegistrationStatusType.CONFIRMED
+    registration.status = EventRegistrationStatusType.CANCELLED
+    registration.save(update_fields=["status", "updated_at"])
+
+    if was_confirmed:
+        release_slot(registration.event_id)
+        promote_waitlist(registration.event_id)
+
+    return registration
+
+
+@transaction.atomic()
+def promote_waitlist(event_id):
+    """Confirm waitlisted registrations, oldest first, while slots are free."""
+    promoted = 0
+    while True:
+        registration = (
+            EventRegistration.objects.select_for_update(skip_locked=True)
+            .filter(event_id=event_id, status=EventRegistrationStatusType.WAITLISTED)
+            .order_by("created_at")
+            .first()
+        )
+        if registration is None or not reserve_slot(event_id):
+            break
+
+        registration.status = EventRegistrationStatusType.CONFIRMED
+        registration.save(update_fields=["status", "updated_at"])
+        promoted += 1
+
+    if promoted:
+        logger.info(f"Promoted {promoted} waitlisted registration(s) for event {event_id}.")
+    return promoted
@@ -0,0 +1,108 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+
+from utilities.pubsub import run_sync
+from .pagination import AttendeeExportPagination
+
+ATTENDEE_EXPORT_FIELDS = ("id", "name", "email", "event_id", "event__title", "status", "created_at")
+ATTENDEE_EXPORT_COLUMNS = ("id", "name", "email", "event_id", "event_title", "status", "created_at")
+EXPORT_CHUNK_SIZE = 2000
+# a cell starting with one of these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def attendee_rows(queryset):
+    # iterator() streams from a server-side cursor where the backend has one
+    return queryset.values_list(*ATTENDEE_EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def attendee_chunk(queryset, position=None):
+    """The EXPORT_CHUNK_SIZE rows after `position`, the keyset of the previous chunk's last row."""
+    keyset = AttendeeExportPagination()
+    queryset = queryset.order_by(*keyset.ordering)
+    if position is not None:
+        queryset = queryset.filter(keyset.after(position))
+    return list(queryset.values_list(*ATTENDEE_EXPORT_FIELDS)[:EXPORT_CHUNK_SIZE])
+
+
+async def attendee_chunks(queryset):
+    """
+    Async counterpart of `attendee_rows`, one chunk per query. Each query
+    may run on another thread, so a chunk seeks past the last row instead
+    of reading on from a cursor.
+    """
+    position = None
+    while True:
+        rows = await run_sync(attendee_chunk, queryset, position)
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        row = dict(zip(ATTENDEE_EXPORT_FIELDS, rows[-1]))
+        position = [row[field] for field in AttendeeExportPagination.ordering]
+
+
+def escape_formula(value):
+    """Names and emails come from anonymous registrations, keep organizers' spreadsheets from evaluating them."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def csv_format():
+    """
+    (header, formatter of each row) for one CSV export. The writer is the
+    export's own, csv.writer buffers the row it's writing, so exports running
+    on other threads would mix their rows into it.
+    """
+    writer = csv.writer(Echo())
+
+    def line(row):
+        return writer.writerow([escape_formula(value) for value in row])
+
+    return writer.writerow(ATTENDEE_EXPORT_COLUMNS), line
+
+
+def ndjson_line(row):
+    return json.dumps(dict(zip(ATTENDEE_EXPORT_COLUMNS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def ndjson_format():
+    return "", ndjson_line
+
+
+# content type, and what makes the (header, formatter of each row) of an export
+EXPORT_FORMATS = {
+    "csv": ("text/csv", csv_format),
+    "ndjson": ("application/x-ndjson", ndjson_format),
+}
+
+
+def stream_export(queryset, file_format):
+    """The export as lines, read from a server-side cursor. For WSGI."""
+    header, line = EXPORT_FORMATS[file_format][1]()
+    if header:
+        yield header
+    for row in attendee_rows(queryset):
+        yield line(row)
+
+
+async def astream_export(queryset, file_format):
+    """
+    The export a chunk of rows at a time, for ASGI: Django's ASGI handler
+    would read a sync iterator into a list, the whole export in memory,
+    before sending any of it.
+    """
+    header, line = EXPORT_FORMATS[file_format][1]()
+    if header:
+        yield header
+    async for rows in attendee_chunks(queryset):
+        yield "".join(line(row) for row in rows)
@@ -0,0 +1,29 @@
+from django.db.models.functions import Lower
+from django_filters import rest_framework as filters
+
+from utilities.choices import EventRegistrationStatusType
+from .models import Event, EventRegistration
+
+
+class EventFilter(filters.FilterSet):
+    city = filters.CharFilter(method="filter_city")
+    country = filters.CharFilter(field_name="country")
+    date = filters.DateFromToRangeFilter(field_name="date")
+    is_paid = filters.BooleanFilter(field_name="is_paid")
+
+    class Meta:
+        model = Event
+        fields = ("city", "country", "date", "is_paid")
+
+    def filter_city(self, queryset, name, value):
+        # compare against LOWER(city) so the lookup hits event_city_date_idx
+        return queryset.alias(city_lower=Lower("city")).filter(city_lower=value.lower())
+
+
+class AttendeeFilter(filters.FilterSet):
+    event = filters.UUIDFilter(field_name="event_id")
+    status = filters.ChoiceFilter(field_name="status", choices=EventRegistrationStatusType.choices)
+
+    class Meta:
+        model = EventRegistration
+        fields = ("event", "status")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tracking import LocalViewQueue, get_event_view_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the shared event view queue into the database, e.g. after a worker died with views pending. "
+        "Only works with core.tracking.RedisViewQueue, the in-memory LocalViewQueue belongs to the worker process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Maximum number of views to write.")
+
+    def handle(self, *args, **options):
+        buffer = get_event_view_buffer()
+        if isinstance(buffer.queue, LocalViewQueue):
+            # this process has its own, empty, queue: workers flush theirs on their own and on exit
+            raise CommandError("EVENT_VIEW_BUFFER[\"QUEUE\"] is the in-memory LocalViewQueue, there is nothing to drain from here.")
+
+        written = buffer.flush(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} event view(s)."))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import analytics
+
+
+class Command(BaseCommand):
+    help = "Rebuild event stats rollups from the raw EventView and EventRegistration tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=1, help="Number of past days to rebuild, including today.")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"] - 1)
+        rebuilt = analytics.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} rollup(s)."))
@@ -0,0 +1,27 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.reminders import send_due_reminders
+
+
+class Command(BaseCommand):
+    help = "Remind attendees of events starting soon. Safe to re-run, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=settings.EVENT_REMINDER_WINDOW_HOURS, help="Remind about events starting within this many hours.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, checking every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=300)
+
+    def handle(self, *args, **options):
+        window = timedelta(hours=options["hours"])
+        while True:
+            sent = send_due_reminders(window)
+            self.stdout.write(f"Sent {sent} reminder(s).")
+
+            if not options["loop"]:
+                break
+            close_old_connections()
+            time.sleep(options["interval"])
@@ -1,9 +1,16 @@
-from django.db import models
+from datetime import datetime, time
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
 from django_countries.fields import CountryField
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
+from utilities.geo import encode_geohash
 from utilities.utils import BaseModelMixin
-from utilities.choices import EventRegistrationStatusType
+from utilities.choices import EventRegistrationStatusType, RollupGranularityType
 
 User = get_user_model()
 
@@ -18,7 +25,69 @@ class Event(BaseModelMixin):
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     city = models.CharField(max_length=150)
     country = CountryField()
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # derived from latitude/longitude on save, prefix scans on it back the nearby search
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False, db_index=True)
     slot = models.PositiveIntegerField()
+    # denormalized counter so registrations never COUNT(*) event_registrations, see core.capacity
+    remaining_slots = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(BaseModelMixin.Meta):
+        # each filter column leads an index that ends in the (date, id) pagination key
+        indexes = [
+            models.Index(fields=["date", "id"], name="event_date_id_idx"),
+            models.Index(Lower("city"), F("date"), F("id"), name="event_city_date_idx"),
+            models.Index(fields=["country", "date", "id"], name="event_country_date_idx"),
+            models.Index(fields=["is_paid", "date", "id"], name="event_is_paid_date_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_slot = instance.__dict__.get("slot")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ""
+
+        if self._state.adding:
+            self.remaining_slots = self.slot
+            super().save(*args, **kwargs)
+            self._loaded_slot = self.slot
+            return
+
+        # remaining_slots is only ever written with conditional UPDATEs, a plain
+        # save must not overwrite it with the (possibly stale) in-memory value
+        if kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "remaining_slots"
+            ]
+
+        loaded_slot = getattr(self, "_loaded_slot", None)
+        if loaded_slot is None or loaded_slot == self.slot or "slot" not in kwargs["update_fields"]:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            # slot and remaining_slots move together against the row's current values, and
+            # the slot can't drop below the registrations already confirmed
+            resized = Event.objects.filter(pk=self.pk, remaining_slots__gte=F("slot") - self.slot).update(
+                slot=self.slot, remaining_slots=F("remaining_slots") + (self.slot - F("slot"))
+            )
+            if not resized:
+                raise ValidationError({"slot": "Can't be lower than the number of confirmed registrations."})
+            kwargs["update_fields"] = [name for name in kwargs["update_fields"] if name != "slot"]
+            super().save(*args, **kwargs)
+        self._loaded_slot = self.slot
+
+    @property
+    def starts_at(self):
+        return timezone.make_aware(datetime.combine(self.date, self.time or time.min))
 
     @property
     def link_uri(self):
@@ -30,6 +99,26 @@ class EventRegistration(BaseModelMixin):
     email = models.EmailField()
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="event_registrations")
     status = models.CharField(max_length=10, choices=EventRegistrationStatusType.choices)
+    # set once the attendee got their reminder, see core.reminders
+    reminded_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta(BaseModelMixin.Meta):
+        indexes = [
+            models.Index(fields=["event", "-created_at", "-id"], name="registration_event_created_idx"),
+            models.Index(
+                fields=["event", "id"],
+                condition=models.Q(status=EventRegistrationStatusType.CONFIRMED, reminded_at__isnull=True),
+                name="registration_unreminded_idx",
+            ),
+        ]
+        constraints = [
+            # one live registration per email and event, cancelled ones may register again
+            models.UniqueConstraint(
+                "event", Lower("email"),
+                condition=~models.Q(status=EventRegistrationStatusType.CANCELLED),
+                name="unique_event_registration_email",
+            ),
+        ]
 
 
 class EventView(BaseModelMixin):
@@ -37,4 +126,36 @@ class EventView(BaseModelMixin):
     visitor_id = models.CharField(max_length=200, null=True, blank=True) # would be gotten from cookies 
     user = models.CharField(max_length=200, null=True, blank=True)
     user_agent = models.TextField()
-    ip_address = models.CharField(max_length=30)
\ No newline at end of file
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+
+
+class EventStatsRollup(BaseModelMixin):
+    """Pre-aggregated views, unique visitors and registrations per event and time bucket."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="stats_rollups")
+    granularity = models.CharField(max_length=10, choices=RollupGranularityType.choices)
+    bucket_start = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    registrations = models.PositiveIntegerField(default=0)
+    visitors_sketch = models.BinaryField(default=bytes) # utilities.hyperloglog.HyperLogLog registers
+
+    class Meta:
+        ordering = ["bucket_start"]
+        constraints = [
+            models.UniqueConstraint(fields=["event", "granularity", "bucket_start"], name="unique_event_stats_bucket"),
+        ]
+
+
+class EventSearchTerm(models.Model):
+    """Inverted index over the event text fields, maintained by core.search."""
+    term = models.CharField(max_length=64)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="search_terms")
+    weight = models.FloatField() # field weighted occurrences of the term in the event
+
+    class Meta:
+        indexes = [
+            # prefix and exact term lookups are range scans that read the event ids from the index
+            models.Index(fields=["term", "event", "weight"], name="event_search_term_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["event", "term"], name="unique_event_search_term"),
+        ]
@@ -0,0 +1,16 @@
+from utilities.pagination import KeysetPagination
+
+
+class EventPagination(KeysetPagination):
+    # upcoming events first, matches event_date_id_idx
+    ordering = ("date", "id")
+
+
+class AttendeePagination(KeysetPagination):
+    # newest registrations first, matches registration_event_created_idx
+    ordering = ("-created_at", "-id")
+
+
+class AttendeeExportPagination(KeysetPagination):
+    # the export walks registrations event by event, oldest first
+    ordering = ("event_id", "created_at", "id")
@@ -0,0 +1,15 @@
+from rest_framework import permissions
+
+from . import capacity
+
+
+class CanCancelRegistration(permissions.BasePermission):
+    """The registrant, with the cancel token they got when registering, or the event's organizer."""
+    message = "A valid cancel token is required to cancel this registration."
+
+    def has_object_permission(self, request, view, obj):
+        if request.user and request.user.is_authenticated and obj.event.organizer_id == request.user.pk:
+            return True
+        # a JSON body needn't be an object, anything else carries no token
+        token = request.data.get("token") if isinstance(request.data, dict) else None
+        return capacity.valid_cancel_token(obj.pk, token)
@@ -0,0 +1,92 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from user.mailer import queue_emails
+from user.models import OutboundEmail, User
+from user.notifications import fan_out
+from utilities.choices import EventRegistrationStatusType, NotificationType
+from .models import Event, EventRegistration
+
+logger = logging.getLogger(__name__)
+
+
+def due_events(window, now=None):
+    """Events starting within `window` from now with confirmed attendees who haven't been reminded."""
+    now = now or timezone.now()
+    end = now + window
+
+    # the date range rides event_date_id_idx, the exact start is checked on the few rows it returns
+    events = (
+        Event.objects.filter(date__gte=now.date(), date__lte=end.date())
+        .filter(Exists(unreminded(OuterRef("pk"))))
+        .only("id", "title", "date", "time", "city")
+        .order_by("date", "id")
+    )
+    return [event for event in events if now <= event.starts_at <= end]
+
+
+def unreminded(event):
+    """Confirmed registrations to `event` not reminded yet, matching registration_unreminded_idx."""
+    return EventRegistration.objects.filter(event=event, status=EventRegistrationStatusType.CONFIRMED, reminded_at__isnull=True)
+
+
+def send_reminder(event):
+    """
+    Remind the confirmed attendees of an event who haven't been reminded,
+    by email and, for attendees with an account, by notification. Attendees
+    who turned off `receive_event_reminders` are skipped. Each chunk is
+    marked reminded in the transaction that queues it, so an interrupted run
+    picks up where it stopped, and attendees confirmed or promoted from the
+    waitlist after a run are reminded by the next one.
+    """
+    chunk_size = settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    subject = f"Reminder: {event.title} is coming up"
+    starts = event.starts_at.strftime("%A %d %B %Y, %H:%M")
+    metadata = dict(message=f"{event.title} starts on {starts}", event_id=str(event.pk))
+
+    sent = 0
+    while True:
+        with transaction.atomic():
+            # skip_locked lets a second run take the next chunk instead of sending this one again
+            chunk = list(
+                unreminded(event).select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list("id", "name", "email")[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            # registrations keep the email as typed, accounts may differ from it in case
+            users = User.objects.annotate(email_lower=Lower("email")).filter(email_lower__in={email.lower() for _, _, email in chunk})
+            user_ids = dict(users.values_list("email_lower", "pk"))
+            opted_out = set(
+                users.filter(notification_preference__receive_event_reminders=False).values_list("email_lower", flat=True)
+            )
+            recipients = [(name, email) for _, name, email in chunk if email.lower() not in opted_out]
+
+            queue_emails([
+                OutboundEmail(
+                    to_email=email,
+                    subject=subject,
+                    body=f"Hi {name},\n\n{event.title} starts on {starts} in {event.city}.\n\n{event.link_uri}",
+                )
+                for name, email in recipients
+            ])
+            fan_out([user_ids[email.lower()] for _, email in recipients if email.lower() in user_ids], NotificationType.EVENT_REMINDER, metadata)
+            EventRegistration.objects.filter(pk__in=[registration_id for registration_id, _, _ in chunk]).update(reminded_at=timezone.now())
+        sent += len(recipients)
+
+    if sent:
+        logger.info(f"Sent {sent} reminder(s) for event {event.pk}.")
+    return sent
+
+
+def send_due_reminders(window):
+    sent = 0
+    for event in due_events(window):
+        sent += send_reminder(event)
+    return sent
@@ -0,0 +1,150 @@
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Max, Q, Sum, When
+
+from utilities.utils import chunked, next_prefix
+from .models import Event, EventSearchTerm
+
+logger = logging.getLogger(__name__)
+
+# a title hit counts for more than a short description hit, which counts for more than a description hit
+FIELD_WEIGHTS = {"title": 4.0, "short_description": 2.0, "description": 1.0}
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+MAX_PREFIX_COMPLETIONS = 20
+MIN_RANKED_PREFIX = 2 # characters before completions are ranked by how many events use them
+# the characters of most terms, in the order every collation sorts them
+TERM_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+STOP_WORDS = frozenset(
+    "an and are as at be by for from in is it of on or the this to with".split()
+)
+TOKEN_RE = re.compile(r"\w+")
+
+
+def words(text):
+    """Lower-cased, accent-stripped words of `text`."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text)]
+
+
+def is_indexed(word):
+    return len(word) > 1 and word not in STOP_WORDS
+
+
+def tokenize(text):
+    """Lower-cased, accent-stripped words of `text`, without stop words or single characters."""
+    return [word for word in words(text) if is_indexed(word)]
+
+
+def query_terms(query):
+    """
+    The words of `query` to match whole, and the last one to match as a prefix.
+    The prefix is kept even when it is a stop word or a single character, since
+    "the" or "j" may be the start of a word still being typed.
+    """
+    *whole, prefix = words(query) or [None]
+    return list(dict.fromkeys(word for word in whole if is_indexed(word)))[:MAX_QUERY_TERMS - 1], prefix
+
+
+def term_weights(event):
+    weights = Counter()
+    for field, field_weight in FIELD_WEIGHTS.items():
+        for term, occurrences in Counter(tokenize(getattr(event, field))).items():
+            # log damping, so repeating a word in a long description doesn't outrank the title
+            weights[term] += field_weight * (1 + math.log(occurrences))
+    return weights
+
+
+def index_events(events):
+    """(Re)build the search terms of the given events."""
+    events = list(events)
+    with transaction.atomic():
+        EventSearchTerm.objects.filter(event__in=events).delete()
+        EventSearchTerm.objects.bulk_create([
+            EventSearchTerm(event=event, term=term, weight=round(weight, 4))
+            for event in events
+            for term, weight in term_weights(event).items()
+        ])
+
+
+def index_event(event):
+    index_events([event])
+
+
+def rebuild(batch_size=1000):
+    """Re-index every event, returns the number indexed."""
+    events = Event.objects.only("id", *FIELD_WEIGHTS).order_by("id")
+    indexed = 0
+    for chunk in chunked(events.iterator(chunk_size=batch_size), batch_size):
+        index_events(chunk)
+        indexed += len(chunk)
+    logger.info(f"Indexed {indexed} event(s) for search.")
+    return indexed
+
+
+def completions(prefix, limit=MAX_PREFIX_COMPLETIONS):
+    """
+    Indexed terms starting with `prefix`, those found in the most events first.
+    Capped, since matching a short prefix against every term would rank a large
+    share of the index. A single character would still have to count the
+    events of every term it starts, so those are completed in index order.
+    """
+    # a range rather than startswith, LIKE can't use a plain btree index. Bounded within
+    # TERM_ALPHABET, a bound on punctuation sorts differently from one collation to the next
+    terms = EventSearchTerm.objects.filter(term__gte=prefix, term__startswith=prefix)
+    upper = next_prefix(prefix, TERM_ALPHABET)
+    if upper is not None:
+        terms = terms.filter(term__lt=upper)
+    if len(prefix) < MIN_RANKED_PREFIX:
+        return list(terms.order_by("term").values_list("term", flat=True).distinct()[:limit])
+    return list(
+        terms.values("term")
+        .annotate(events=Count("event_id"))
+        .order_by("-events", "term")
+        .values_list("term", flat=True)[:limit]
+    )
+
+
+def search(query, limit=20):
+    """
+    Events matching every word of `query`, the last word as a prefix for
+    typeahead, as (event, rank) pairs, best first. The rank adds up the
+    weights of the matched terms.
+    """
+    terms, prefix = query_terms(query)
+    conditions = [Q(term=term) for term in terms]
+    if prefix is not None:
+        last_terms = completions(prefix)
+        if last_terms:
+            conditions.append(Q(term__in=last_terms))
+        elif is_indexed(prefix):
+            return []
+        # otherwise it's a stop word or single character that starts no term, so nothing to match on
+    if not conditions:
+        return []
+
+    matched_any = Q()
+    for condition in conditions:
+        matched_any |= condition
+
+    # one flag per query word, an event has to match them all
+    flags = {
+        f"matched_{index}": Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+        for index, condition in enumerate(conditions)
+    }
+    ranked = list(
+        EventSearchTerm.objects.filter(matched_any)
+        .values("event_id")
+        .annotate(rank=Sum("weight"), **flags)
+        .filter(**{flag: 1 for flag in flags})
+        .order_by("-rank", "event_id")
+        .values_list("event_id", "rank")[:limit]
+    )
+
+    events = Event.objects.in_bulk([event_id for event_id, _ in ranked])
+    return [(events[event_id], rank) for event_id, rank in ranked if event_id in events]
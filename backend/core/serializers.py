@@ -1,9 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Event, EventRegistration
 
 
 class EventSerializers:
-    class EventCreateSerializer(serializers.ModelSerializers):
+    class EventCreateSerializer(serializers.ModelSerializer):
         class Meta:
             model = Event
             fields = (
@@ -17,11 +18,14 @@ class EventSerializers:
                 "price",
                 "city",
                 "country",
+                "latitude",
+                "longitude",
                 "slot"
             )
+            extra_kwargs = {"organizer": {"read_only": True}}
 
     
-    class EventRetrieveSerializer(serializers.ModelSerializers):
+    class EventRetrieveSerializer(serializers.ModelSerializer):
         share_url = serializers.CharField(source='link_uri')
 
         class Meta:
@@ -38,11 +42,36 @@ class EventSerializers:
                 "price",
                 "city",
                 "country",
+                "latitude",
+                "longitude",
                 "slot",
+                "remaining_slots",
                 "share_url",
                 "created_at"
             )
 
+    class NearbyEventsQuerySerializer(serializers.Serializer):
+        lat = serializers.FloatField(min_value=-90, max_value=90)
+        lng = serializers.FloatField(min_value=-180, max_value=180)
+        radius_km = serializers.FloatField(min_value=0.1, max_value=500, default=25)
+        limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
+    class EventSearchQuerySerializer(serializers.Serializer):
+        q = serializers.CharField(max_length=200)
+        limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class EventRegistrationListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return EventRegistration.objects.bulk_create([EventRegistration(**attrs) for attrs in validated_data])
+
+
+class AttendeeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventRegistration
+        fields = ['name', 'email']
+        list_serializer_class = EventRegistrationListSerializer
+
 
 class EventRegistrationSerializers:
     class EventRegistrationCreateSerializer(serializers.ModelSerializer):
@@ -64,4 +93,8 @@ class EventRegistrationSerializers:
                 "event",
                 "status",
                 "created_at"
-            )
\ No newline at end of file
+            )
+
+    class BulkEventRegistrationCreateSerializer(serializers.Serializer):
+        event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all())
+        attendees = AttendeeSerializer(many=True, allow_empty=False, max_length=settings.BULK_REGISTRATION_MAX_SIZE)
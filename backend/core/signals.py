@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from user.notifications import notify_nearby_users
+from utilities.tasks import run_on_commit
+from .models import Event, EventRegistration
+from . import analytics, cache, search, streams
+
+
+@receiver(post_save, sender=EventRegistration)
+def update_registration_rollups(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: analytics.record_registrations([instance]))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: cache.invalidate_event(instance.pk))
+
+
+@receiver(post_save, sender=EventRegistration)
+@receiver(post_delete, sender=EventRegistration)
+def invalidate_event_capacity_cache(sender, instance, **kwargs):
+    # registrations move remaining_slots, which the detail displays and list pages read fresh
+    transaction.on_commit(lambda: cache.invalidate_event_capacity(instance.event_id))
+    run_on_commit(streams.publish_capacity, instance.event_id)
+
+
+@receiver(post_save, sender=Event)
+def update_search_index(sender, instance, update_fields, **kwargs):
+    if update_fields is None or not update_fields.isdisjoint(search.FIELD_WEIGHTS):
+        search.index_event(instance)
+
+
+@receiver(post_save, sender=Event)
+def notify_users_nearby(sender, instance, created, **kwargs):
+    if created:
+        run_on_commit(notify_nearby_users, instance.pk)
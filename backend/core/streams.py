@@ -0,0 +1,36 @@
+from django.http import Http404
+
+from utilities.pubsub import asgi_only, get_broker, run_sync, sse_response
+from .models import Event
+
+
+def event_channel(event_id):
+    return f"event:{event_id}"
+
+
+def capacity_data(event):
+    return dict(event_id=str(event.pk), slot=event.slot, remaining_slots=event.remaining_slots)
+
+
+def get_capacity(event_id):
+    return Event.objects.only("id", "slot", "remaining_slots").filter(pk=event_id).first()
+
+
+def publish_capacity(event_id):
+    """Push the event's current capacity to its open streams, after registrations moved it."""
+    channel = event_channel(event_id)
+    broker = get_broker()
+    if not broker.has_subscribers(channel):
+        return
+    event = get_capacity(event_id)
+    if event is not None:
+        broker.publish(channel, dict(event="capacity", data=capacity_data(event)))
+
+
+@asgi_only
+async def event_stream(request, pk):
+    """Server-Sent Events stream of the event's remaining slots, "capacity" events, starting with the current ones."""
+    event = await run_sync(get_capacity, pk)
+    if event is None:
+        raise Http404
+    return sse_response([event_channel(event.pk)], initial=[("capacity", capacity_data(event))])
@@ -0,0 +1,577 @@
+import datetime
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.models import Feature, NotificationPreference, OutboundEmail, SubscriptionPlan, User, UserSubscription
+from utilities.choices import EventRegistrationStatusType, FeatureType
+from utilities.geo import next_cell, within_cells
+from utilities.idempotency import IDEMPOTENCY_HEADER
+from utilities.replicas import PIN_COOKIE
+from utilities.utils import generate_uuid, next_prefix
+from .exports import csv_format
+from .models import Event, EventRegistration, EventView
+from .pagination import EventPagination
+from . import cache as event_cache, reminders, search
+from .tracking import EventViewBuffer, LocalViewQueue
+
+
+def create_user(email="organizer@example.com"):
+    return User.objects.create_user(email=email, password=None, username=email.split("@")[0], first_name="Ada", last_name="Obi")
+
+
+def create_event(organizer, slot=10, **fields):
+    fields = {
+        **dict(
+            title="Lagos Jazz Night", date=datetime.date.today() + datetime.timedelta(days=30), description="Live jazz",
+            short_description="Jazz", city="Lagos", country="NG",
+        ),
+        **fields,
+    }
+    return Event.objects.create(organizer=organizer, slot=slot, **fields)
+
+
+def register(event, email, name="Attendee", client=None, **extra):
+    client = client or APIClient()
+    return client.post(reverse("event-registrations-list"), dict(event=str(event.pk), name=name, email=email), format="json", **extra)
+
+
+def concurrently(func, count, workers=20):
+    """`func(0)` ... `func(count - 1)` from `workers` threads, each with its own database connection."""
+
+    def call(index):
+        try:
+            return func(index)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(call, range(count)))
+
+
+class RegistrationApiTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = create_user()
+        self.event = create_event(self.organizer, slot=1)
+
+    def test_registrations_are_not_listed_updated_or_deleted(self):
+        confirmed = register(self.event, "first@example.com").data["data"]
+        waitlisted = register(self.event, "second@example.com").data["data"]
+        self.assertEqual(waitlisted["status"], EventRegistrationStatusType.WAITLISTED)
+
+        self.assertEqual(self.client.get(reverse("event-registrations-list")).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        for method in ("get", "patch", "put", "delete"):
+            response = getattr(self.client, method)(f"{reverse('event-registrations-list')}{waitlisted['id']}/", {"status": "CONFIRMED"}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.remaining_slots, 0)
+        self.assertEqual(EventRegistration.objects.get(pk=confirmed["id"]).status, EventRegistrationStatusType.CONFIRMED)
+        self.assertEqual(EventRegistration.objects.get(pk=waitlisted["id"]).status, EventRegistrationStatusType.WAITLISTED)
+
+    def test_registrant_cancels_with_their_cancel_token(self):
+        first = register(self.event, "first@example.com").data
+        second = register(self.event, "second@example.com").data
+        url = reverse("event-registrations-cancel", args=[first["data"]["id"]])
+
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(url, {"token": second["cancel_token"]}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(url, {"token": first["cancel_token"]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], EventRegistrationStatusType.CANCELLED)
+        # the freed slot went to the waitlist
+        self.assertEqual(EventRegistration.objects.get(pk=second["data"]["id"]).status, EventRegistrationStatusType.CONFIRMED)
+
+    def test_cancel_body_that_is_not_an_object_carries_no_token(self):
+        registration = register(self.event, "first@example.com").data["data"]
+        url = reverse("event-registrations-cancel", args=[registration["id"]])
+
+        for body in ([], ["token"], "token"):
+            self.assertEqual(self.client.post(url, body, format="json").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(EventRegistration.objects.get(pk=registration["id"]).status, EventRegistrationStatusType.CONFIRMED)
+
+    def test_only_the_organizer_cancels_without_a_token(self):
+        registration = register(self.event, "first@example.com").data["data"]
+        url = reverse("event-registrations-cancel", args=[registration["id"]])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(create_user('someone@example.com'))}")
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.organizer)}")
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.remaining_slots, 1)
+
+    def test_slot_cannot_drop_below_the_confirmed_registrations(self):
+        self.event.slot = 3
+        self.event.save()
+        first = register(self.event, "first@example.com").data
+        register(self.event, "second@example.com")
+        url = reverse("events-detail", args=[self.event.pk])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.organizer)}")
+
+        self.assertEqual(self.client.patch(url, {"slot": 1}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.patch(url, {"slot": 2}, format="json").status_code, status.HTTP_200_OK)
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.slot, self.event.remaining_slots), (2, 0))
+
+        # a cancellation frees one slot, it doesn't hand out one more than the event has
+        cancel_url = reverse("event-registrations-cancel", args=[first["data"]["id"]])
+        self.assertEqual(self.client.post(cancel_url).status_code, status.HTTP_200_OK)
+        statuses = [register(self.event, f"late{index}@example.com").data["data"]["status"] for index in range(2)]
+        self.assertEqual(statuses, [EventRegistrationStatusType.CONFIRMED, EventRegistrationStatusType.WAITLISTED])
+        self.assertEqual(EventRegistration.objects.filter(event=self.event, status=EventRegistrationStatusType.CONFIRMED).count(), 2)
+
+    def test_retry_with_the_same_idempotency_key_replays_the_response(self):
+        headers = {f"HTTP_{IDEMPOTENCY_HEADER.upper().replace('-', '_')}": "retry-1"}
+        first = register(self.event, "first@example.com", **headers)
+        retry = register(self.event, "first@example.com", **headers)
+
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(register(self.event, "other@example.com", **headers).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_idempotency_keys_are_scoped_to_the_client(self):
+        headers = {f"HTTP_{IDEMPOTENCY_HEADER.upper().replace('-', '_')}": "retry-1"}
+        first = register(self.event, "first@example.com", REMOTE_ADDR="10.0.0.1", **headers)
+
+        # someone else replaying the key and body doesn't get the first client's cancel token
+        replayed = register(self.event, "first@example.com", REMOTE_ADDR="10.0.0.2", **headers)
+        self.assertEqual(replayed.status_code, status.HTTP_200_OK)
+        self.assertNotIn("cancel_token", replayed.data)
+        self.assertFalse(replayed.has_header("Idempotent-Replayed"))
+
+        # nor does the same key with another body collide with the first client's
+        other = register(self.event, "other@example.com", REMOTE_ADDR="10.0.0.3", **headers)
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(other.data["cancel_token"], first.data["cancel_token"])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {"registrations": "3/min"}})
+    def test_forged_forwarded_for_does_not_get_round_the_rate_limit(self):
+        responses = [
+            register(self.event, f"attendee{index}@example.com", HTTP_X_FORWARDED_FOR=f"203.0.113.{index}")
+            for index in range(4)
+        ]
+        self.assertEqual([response.status_code for response in responses][-2:], [status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {"registrations": "3/min"}, "NUM_PROXIES": 1})
+    def test_behind_a_proxy_clients_are_told_apart_by_the_address_it_added(self):
+        # the proxy appends the address it saw, whatever the client put in front of it
+        forged = [register(self.event, f"attendee{index}@example.com", HTTP_X_FORWARDED_FOR=f"203.0.113.{index}, 198.51.100.1") for index in range(4)]
+        self.assertEqual(forged[-1].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(register(self.event, "other@example.com", HTTP_X_FORWARDED_FOR="198.51.100.2").status_code, status.HTTP_201_CREATED)
+
+
+class EventViewBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event(create_user())
+        self.buffer = EventViewBuffer(LocalViewQueue(max_size=100), batch_size=10, flush_interval=60, dedup_window=60, max_attempts=3)
+        # no background flusher, the test flushes itself
+        self.buffer._flusher = object()
+
+    def view(self, visitor_id, **fields):
+        return {**dict(event_id=str(self.event.pk), visitor_id=visitor_id, user=None, user_agent="test", ip_address="2001:db8::1"), **fields}
+
+    def test_record_leaves_the_write_to_the_flusher(self):
+        for index in range(10):
+            self.assertTrue(self.buffer.record(self.event.pk, f"visitor-{index}", None, "test", "2001:db8:85a3::8a2e:370:7334"))
+        self.assertEqual(EventView.objects.count(), 0)
+        self.assertTrue(self.buffer._wake_flusher.is_set())
+
+        self.assertEqual(self.buffer.flush(), 10)
+        self.assertEqual(EventView.objects.filter(ip_address="2001:db8:85a3::8a2e:370:7334").count(), 10)
+
+    def test_a_row_that_keeps_failing_is_dropped_after_its_attempts(self):
+        # a NULL user_agent fails the insert on every database
+        for item in [self.view("first"), self.view("bad", user_agent=None), self.view("last")]:
+            self.buffer.queue.push(item)
+
+        for _ in range(2):
+            with self.assertRaises(IntegrityError):
+                self.buffer.flush()
+            self.assertEqual((len(self.buffer.queue), EventView.objects.count()), (3, 0))
+
+        with self.assertLogs("core.tracking", "ERROR"):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(sorted(EventView.objects.values_list("visitor_id", flat=True)), ["first", "last"])
+        self.assertEqual(len(self.buffer.queue), 0)
+
+
+class EventListScaleTests(APITestCase):
+    """The event list over 100k events, a deep page costs what the first one does."""
+
+    events = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        organizer = create_user()
+        today = datetime.date.today()
+        Event.objects.bulk_create(
+            [
+                Event(
+                    title=f"Event {index}", date=today + datetime.timedelta(days=index % 3650), description="d", short_description="s",
+                    organizer=organizer, city="Lagos", country="NG", slot=10, remaining_slots=10,
+                )
+                for index in range(cls.events)
+            ],
+            batch_size=2000,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.pagination = EventPagination()
+
+    def deep_position(self):
+        return list(Event.objects.order_by("-date", "-id").values_list("date", "id")[100])
+
+    def test_first_and_deep_pages_cost_one_query(self):
+        url = reverse("events-list")
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        self.assertEqual(len(first.data["results"]), self.pagination.page_size)
+
+        position = self.deep_position()
+        with self.assertNumQueries(1):
+            deep = self.client.get(url, {"cursor": self.pagination.encode_cursor(position)})
+        results = deep.data["results"]
+        self.assertEqual(len(results), self.pagination.page_size)
+        self.assertGreater((results[0]["date"], results[0]["id"]), (position[0].isoformat(), str(position[1])))
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite's query plan")
+    def test_a_deep_page_seeks_the_index_instead_of_scanning_it(self):
+        page = Event.objects.filter(self.pagination.after(self.deep_position())).order_by(*self.pagination.ordering)
+        plan = page[: self.pagination.page_size + 1].explain()
+        self.assertIn("SEARCH core_event USING INDEX event_date_id_idx (date>?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class EventListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event(create_user(), slot=5)
+        self.other = create_event(self.event.organizer, title="Abuja Food Market")
+
+    def remaining_slots(self, response):
+        return {result["id"]: result["remaining_slots"] for result in response.data["results"]}
+
+    def test_registrations_keep_the_cached_page_with_fresh_capacity(self):
+        url = reverse("events-list")
+        first = self.client.get(url)
+        list_version = event_cache.get_version(event_cache.LIST_SCOPE)
+
+        detail_version = event_cache.get_version(event_cache.event_scope(self.event.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                register(self.event, f"attendee{index}@example.com")
+        self.assertNotEqual(event_cache.get_version(event_cache.event_scope(self.event.pk)), detail_version)
+        self.assertEqual(event_cache.get_version(event_cache.LIST_SCOPE), list_version)
+
+        # the page is still cached, only the capacity of its events is read
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(self.remaining_slots(response), {str(self.event.pk): 2, str(self.other.pk): 10})
+        self.assertNotEqual(response["ETag"], first["ETag"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # editing an event still drops the cached pages
+        self.event.title = "Lagos Jazz Weekend"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+        self.assertNotEqual(event_cache.get_version(event_cache.LIST_SCOPE), list_version)
+        self.assertIn("Lagos Jazz Weekend", [result["title"] for result in self.client.get(url).data["results"]])
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        soon = timezone.localtime() + datetime.timedelta(hours=2)
+        self.event = create_event(create_user(), date=soon.date(), time=soon.time())
+
+    def registration(self, email, status=EventRegistrationStatusType.CONFIRMED):
+        return EventRegistration.objects.create(event=self.event, name="Attendee", email=email, status=status)
+
+    def reminded(self):
+        sent = reminders.send_due_reminders(datetime.timedelta(hours=24))
+        emails = sorted(OutboundEmail.objects.values_list("to_email", flat=True))
+        OutboundEmail.objects.all().delete()
+        return sent, emails
+
+    def test_opted_out_attendees_are_matched_whatever_the_case_of_their_email(self):
+        ada = create_user("ada@example.com")
+        NotificationPreference.objects.create(user=ada, receive_event_reminders=False)
+        self.registration("Ada@Example.com")
+        self.registration("bo@example.com")
+
+        self.assertEqual(self.reminded(), (1, ["bo@example.com"]))
+
+    def test_attendees_confirmed_after_a_run_are_reminded_by_the_next(self):
+        self.registration("first@example.com")
+        waitlisted = self.registration("second@example.com", status=EventRegistrationStatusType.WAITLISTED)
+        self.assertEqual(self.reminded(), (1, ["first@example.com"]))
+
+        waitlisted.status = EventRegistrationStatusType.CONFIRMED
+        waitlisted.save()
+        self.registration("third@example.com")
+        self.assertEqual(self.reminded(), (2, ["second@example.com", "third@example.com"]))
+        self.assertEqual(self.reminded(), (0, []))
+
+
+class GeohashCellTests(TestCase):
+    def test_cells_ending_in_the_last_letter_are_bounded_within_the_alphabet(self):
+        self.assertEqual(next_cell("s14kz"), "s14m")
+        self.assertEqual(next_cell("s1zz"), "s2")
+        self.assertIsNone(next_cell("zz"))
+
+        organizer = create_user()
+        inside = create_event(organizer, latitude=6.46, longitude=3.475)
+        create_event(organizer, latitude=6.6, longitude=3.35)
+        self.assertEqual(inside.geohash[:5], "s14kz")
+        for cells in (["s14kz"], ["s14ky", "s14kz"]):
+            self.assertEqual(list(Event.objects.filter(within_cells(cells)).values_list("pk", flat=True)), [inside.pk])
+        self.assertFalse(Event.objects.filter(within_cells(["zz"])).exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        organizer = create_user()
+        for title in ("Theatre Night", "Indie Jazz", "Jazz Brunch", "Jazz in the Park", "Jam Session"):
+            create_event(organizer, title=title, description=title, short_description=title)
+
+    def titles(self, query):
+        return sorted(event.title for event, _ in search.search(query))
+
+    def test_the_last_word_is_a_prefix_even_when_it_is_a_stop_word_or_a_single_letter(self):
+        self.assertEqual(self.titles("the"), ["Theatre Night"])
+        self.assertEqual(self.titles("in"), ["Indie Jazz"])
+        self.assertEqual(self.titles("j"), ["Indie Jazz", "Jam Session", "Jazz Brunch", "Jazz in the Park"])
+        # earlier words are still matched whole, so stop words among them are skipped
+        self.assertEqual(self.titles("jazz in the pa"), ["Jazz in the Park"])
+        # nor does a stop word or single letter that starts no term narrow the results, unlike any other word
+        self.assertEqual(self.titles("jazz a"), ["Indie Jazz", "Jazz Brunch", "Jazz in the Park"])
+        self.assertEqual(self.titles("jazz xy"), [])
+
+    def test_completions_prefer_the_terms_in_the_most_events(self):
+        self.assertEqual(search.completions("ja", limit=1), ["jazz"])
+        self.assertEqual(search.completions("ja"), ["jazz", "jam"])
+        # a single character would count every term it starts, it's completed in index order instead
+        self.assertEqual(search.completions("j", limit=1), ["jam"])
+
+    def test_completions_are_bounded_within_the_term_alphabet(self):
+        self.assertEqual(search.completions("jaz"), ["jazz"])
+        self.assertEqual(search.completions("jazz"), ["jazz"])
+        # not "ja{", which sorts before "jazz" in some collations and after it in others
+        self.assertEqual(next_prefix("jaz", search.TERM_ALPHABET), "jb")
+        self.assertEqual(next_prefix("a9", search.TERM_ALPHABET), "aa")
+        self.assertEqual(next_prefix("ja_", search.TERM_ALPHABET), "jb")
+
+
+class EventStreamTests(TestCase):
+    def test_the_stream_is_not_served_under_wsgi(self):
+        event = create_event(create_user())
+        response = self.client.get(reverse("event-stream", args=[event.pk]))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_the_stream_is_served_under_asgi(self):
+        # past the ASGI check to the event lookup
+        response = await self.async_client.get(reverse("event-stream", args=[generate_uuid()]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PaidEventTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = create_user()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.organizer)}")
+        self.event = create_event(self.organizer)
+
+    def test_a_free_event_cannot_be_switched_to_paid_without_the_feature(self):
+        url = reverse("events-detail", args=[self.event.pk])
+        for is_paid in (True, "True", "TRUE", "yes", "on"):
+            self.assertEqual(self.client.patch(url, {"is_paid": is_paid, "price": "10.00"}, format="json").status_code, status.HTTP_403_FORBIDDEN)
+        # not an object at all, rejected by the serializer rather than failing the permission check
+        self.assertEqual(self.client.patch(url, [{"is_paid": True}], format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(reverse("events-list"), [{"is_paid": True}], format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.patch(url, {"title": "Lagos Jazz Weekend"}, format="json").status_code, status.HTTP_200_OK)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.is_paid)
+
+        plan = SubscriptionPlan.objects.create(name="Pro", price="9.99")
+        plan.features.add(Feature.objects.create(name=FeatureType.PAID_EVENTS))
+        UserSubscription.objects.create(user=self.organizer, subscription_plan=plan, end_date=timezone.now() + datetime.timedelta(days=30))
+        cache.clear()
+        self.assertEqual(self.client.patch(url, {"is_paid": True, "price": "10.00"}, format="json").status_code, status.HTTP_200_OK)
+
+
+class RegistrationLoadTests(TransactionTestCase):
+    """Concurrent sign-ups, committed from many threads, so not in TestCase's single transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.event = create_event(create_user(), slot=10)
+
+    def test_concurrent_registrations_never_oversell(self):
+        # a client address each, as many distinct attendees would be, so the rate limits stay out of it
+        responses = concurrently(
+            lambda index: register(self.event, f"attendee{index}@example.com", REMOTE_ADDR=f"10.0.0.{index + 1}"), 60
+        )
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_201_CREATED] * 60)
+        statuses = [response.data["data"]["status"] for response in responses]
+        self.assertEqual(statuses.count(EventRegistrationStatusType.CONFIRMED), 10)
+        self.assertEqual(statuses.count(EventRegistrationStatusType.WAITLISTED), 50)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.remaining_slots, 0)
+        confirmed = EventRegistration.objects.filter(event=self.event, status=EventRegistrationStatusType.CONFIRMED)
+        self.assertEqual(confirmed.count(), self.event.slot)
+
+    def test_same_registration_from_many_threads_is_created_once(self):
+        # one attendee's retries, with the email's case differing between them
+        emails = ["ada@example.com", "Ada@Example.com", "ADA@EXAMPLE.COM"]
+        responses = concurrently(
+            lambda index: register(self.event, emails[index % len(emails)], REMOTE_ADDR=f"10.0.1.{index + 1}"), 30
+        )
+
+        self.assertEqual(sorted(response.status_code for response in responses), [status.HTTP_200_OK] * 29 + [status.HTTP_201_CREATED])
+        self.assertEqual(len({response.data["data"]["id"] for response in responses}), 1)
+        self.assertEqual(EventRegistration.objects.filter(event=self.event).count(), 1)
+        # the attempts that lost the race gave their slot back
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.remaining_slots, self.event.slot - 1)
+
+
+@mock.patch("core.exports.EXPORT_CHUNK_SIZE", 3)
+class AttendeeExportTests(TransactionTestCase):
+    """Read on the threads run_sync hands ASGI queries to, so not in TestCase's single transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.organizer = create_user()
+        for event in (create_event(self.organizer), create_event(self.organizer, title="Abuja Food Market")):
+            EventRegistration.objects.bulk_create([
+                EventRegistration(event=event, name=f"=Attendee {index}", email=f"attendee{index}@example.com", status=EventRegistrationStatusType.CONFIRMED)
+                for index in range(4)
+            ])
+        self.url = reverse("events-export-attendees")
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.organizer)}"}
+
+    async def test_asgi_export_streams_from_an_async_iterator(self):
+        for file_format, line_count in (("csv", 9), ("ndjson", 8)):
+            response = await self.async_client.get(self.url, {"file_format": file_format}, headers=self.headers)
+            self.assertTrue(response.is_async)
+            streamed = "".join([chunk.decode() async for chunk in response.streaming_content])
+
+            # the same rows, in the same order, as the cursor the WSGI export reads from
+            self.assertEqual(streamed, await sync_to_async(self.wsgi_export)(file_format))
+            self.assertEqual(len(streamed.splitlines()), line_count)
+
+    def test_concurrent_csv_exports_keep_their_rows_apart(self):
+        class Slow:
+            """Written through __str__ like a UUID or datetime, which lets other threads run mid-row."""
+
+            def __init__(self, value):
+                self.value = value
+
+            def __str__(self):
+                time.sleep(0.001)
+                return self.value
+
+        def export(index):
+            _, line = csv_format()
+            return [line([Slow(f"{index}-{row}"), Slow(str(index))]) for row in range(20)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            exports = list(executor.map(export, range(8)))
+        for index, lines in enumerate(exports):
+            self.assertEqual(lines, [f"{index}-{row},{index}\r\n" for row in range(20)])
+
+    def wsgi_export(self, file_format):
+        response = self.client.get(self.url, {"file_format": file_format}, headers=self.headers)
+        self.assertFalse(response.is_async)
+        return b"".join(response.streaming_content).decode()
+
+
+REPLICA = "replica_0"
+
+
+@skipUnless(connection.vendor == "sqlite", "the replica is a copy of the primary's SQLite file")
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second SQLite file stands in for a read replica. It only catches up
+    with the primary when replicate() copies it over, so reads that went to
+    it miss whatever was written since.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # added once the test runner has set up its databases, it only ever holds copies of the primary
+        descriptor, cls.replica_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(descriptor)
+        connections.settings[REPLICA] = {**connections["default"].settings_dict, "NAME": cls.replica_path}
+        cls.databases = {"default", REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        self.organizer = create_user()
+        create_event(self.organizer, title="Jazz Night")
+        self.replicate()
+
+    def replicate(self):
+        connections["default"].ensure_connection()
+        connections[REPLICA].ensure_connection()
+        connections["default"].connection.backup(connections[REPLICA].connection)
+
+    def search(self, client):
+        response = client.get(reverse("events-search"), {"q": "jazz"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(event["title"] for event in response.data["results"])
+
+    def test_reads_go_to_the_replica(self):
+        create_event(self.organizer, title="Jazz Brunch")
+
+        self.assertEqual(self.search(APIClient()), ["Jazz Night"])
+        self.replicate()
+        self.assertEqual(self.search(APIClient()), ["Jazz Brunch", "Jazz Night"])
+
+    def test_pin_cookie_reads_your_writes(self):
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.organizer)}")
+        response = writer.post(reverse("events-list"), dict(
+            title="Jazz Brunch", date=datetime.date.today() + datetime.timedelta(days=30), description="Live jazz",
+            short_description="Jazz", city="Lagos", country="NG", slot=10,
+        ), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], settings.DATABASE_REPLICA_PIN_SECONDS)
+
+        # the writer reads the primary while the cookie lasts, everyone else the lagging replica
+        self.assertEqual(self.search(writer), ["Jazz Brunch", "Jazz Night"])
+        self.assertEqual(self.search(APIClient()), ["Jazz Night"])
+
+        # without the cookie the writer is back on the replica
+        writer.cookies.pop(PIN_COOKIE)
+        self.assertEqual(self.search(writer), ["Jazz Night"])
@@ -0,0 +1,258 @@
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from utilities.utils import get_client_ip
+from . import analytics
+from .models import Event, EventView
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SETTINGS = {
+    "QUEUE": "core.tracking.LocalViewQueue",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "BATCH_SIZE": 500,
+    "FLUSH_INTERVAL": 5,
+    "MAX_SIZE": 10_000,
+    "DEDUP_WINDOW": 30 * 60,
+    "MAX_ATTEMPTS": 3,
+}
+
+
+class LocalViewQueue:
+    """In-memory stand-in for the shared Redis queue, only safe within one process."""
+
+    def __init__(self, max_size, **kwargs):
+        self.max_size = max_size
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def push(self, item):
+        with self._lock:
+            if len(self._items) >= self.max_size:
+                return False
+            self._items.append(item)
+            return True
+
+    def pop_batch(self, size):
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(size, len(self._items)))]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisViewQueue:
+    """Redis list shared by every worker, so any process can drain it."""
+
+    key = "eventhub:event-views"
+
+    def __init__(self, max_size, redis_url=None, **kwargs):
+        import redis
+
+        self.max_size = max_size
+        self.client = redis.Redis.from_url(redis_url)
+
+    def push(self, item):
+        if self.client.llen(self.key) >= self.max_size:
+            return False
+        self.client.rpush(self.key, json.dumps(item))
+        return True
+
+    def pop_batch(self, size):
+        pipeline = self.client.pipeline()
+        pipeline.lrange(self.key, 0, size - 1)
+        pipeline.ltrim(self.key, size, -1)
+        items, _ = pipeline.execute()
+        return [json.loads(item) for item in items]
+
+    def __len__(self):
+        return self.client.llen(self.key)
+
+
+class EventViewBuffer:
+    """
+    Write-behind buffer for `EventView` rows.
+
+    Views are queued on the request path and written with `bulk_create` by
+    a background thread, every FLUSH_INTERVAL seconds or as soon as
+    BATCH_SIZE views are pending. A visitor is only counted once per event
+    within DEDUP_WINDOW seconds, and views are dropped while the queue holds
+    MAX_SIZE. A batch that fails to write goes back on the queue, except
+    views of events deleted since they were queued, which are dropped. After
+    MAX_ATTEMPTS failed writes a view is retried on its own, and dropped if
+    it still fails, so one bad row can't hold up the rest.
+    """
+
+    def __init__(self, queue, batch_size, flush_interval, dedup_window, max_attempts=3):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self.max_attempts = max_attempts
+        self._flush_lock = threading.Lock()
+        self._wake_flusher = threading.Event()
+        self._flusher = None
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULT_BUFFER_SETTINGS, **getattr(settings, "EVENT_VIEW_BUFFER", {})}
+        queue_class = import_string(config["QUEUE"])
+        queue = queue_class(max_size=config["MAX_SIZE"], redis_url=config["REDIS_URL"])
+        return cls(
+            queue=queue,
+            batch_size=config["BATCH_SIZE"],
+            flush_interval=config["FLUSH_INTERVAL"],
+            dedup_window=config["DEDUP_WINDOW"],
+            max_attempts=config["MAX_ATTEMPTS"],
+        )
+
+    def record(self, event_id, visitor_id, user, user_agent, ip_address):
+        """Queue a view, returns False when it was a duplicate or got dropped."""
+        if visitor_id and not cache.add(f"event-view:{event_id}:{visitor_id}", 1, self.dedup_window):
+            return False
+
+        item = dict(
+            event_id=str(event_id),
+            visitor_id=visitor_id,
+            user=user,
+            user_agent=user_agent,
+            ip_address=ip_address,
+        )
+        self._ensure_flusher()
+        if not self.queue.push(item):
+            self._wake_flusher.set()
+            logger.warning(f"Event view buffer is full, dropping view for event {event_id}.")
+            return False
+
+        if len(self.queue) >= self.batch_size:
+            self._wake_flusher.set()
+        return True
+
+    def flush(self, limit=None, blocking=True):
+        """Write at most `limit` pending views (all of them by default), returns the number written."""
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+
+        written = 0
+        try:
+            while limit is None or written < limit:
+                size = self.batch_size if limit is None else min(self.batch_size, limit - written)
+                items = self.queue.pop_batch(size)
+                if not items:
+                    break
+                try:
+                    views = self._write(items)
+                except Exception:
+                    views, requeued = self._retry_or_salvage(items)
+                    written += len(views)
+                    analytics.record_views(views)
+                    if requeued:
+                        raise
+                    continue
+                written += len(views)
+                analytics.record_views(views)
+        finally:
+            self._flush_lock.release()
+
+        if written:
+            logger.debug(f"Flushed {written} event view(s).")
+        return written
+
+    def _write(self, items):
+        try:
+            # the foreign keys may only be checked at commit, so commit in here
+            with transaction.atomic():
+                return EventView.objects.bulk_create([self._view(item) for item in items])
+        except IntegrityError:
+            existing = {
+                str(pk) for pk in Event.objects.filter(pk__in={item["event_id"] for item in items}).values_list("pk", flat=True)
+            }
+            kept = [item for item in items if item["event_id"] in existing]
+            if len(kept) < len(items):
+                logger.warning(f"Dropping {len(items) - len(kept)} view(s) of deleted events.")
+            with transaction.atomic():
+                return EventView.objects.bulk_create([self._view(item) for item in kept])
+
+    @staticmethod
+    def _view(item):
+        return EventView(**{key: value for key, value in item.items() if key != "attempts"})
+
+    def _retry_or_salvage(self, items):
+        """
+        Requeue the views of a failed batch that have attempts left, and
+        write the others one part at a time. Returns the views written and
+        whether any were requeued.
+        """
+        requeued, exhausted = [], []
+        for item in items:
+            item = dict(item, attempts=item.get("attempts", 0) + 1)
+            (requeued if item["attempts"] < self.max_attempts else exhausted).append(item)
+
+        dropped = sum(not self.queue.push(item) for item in requeued)
+        if dropped:
+            logger.warning(f"Event view buffer is full, dropping {dropped} view(s) of a failed flush.")
+        return self._write_salvaging(exhausted), bool(requeued)
+
+    def _write_salvaging(self, items):
+        """Write `items` in halves down to single views, dropping the ones that still fail on their own."""
+        if not items:
+            return []
+        try:
+            return self._write(items)
+        except Exception as error:
+            if len(items) == 1:
+                logger.error(f"Dropping a view of event {items[0]['event_id']} after {self.max_attempts} failed writes: {error!r}")
+                return []
+        middle = len(items) // 2
+        return self._write_salvaging(items[:middle]) + self._write_salvaging(items[middle:])
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with _buffer_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="event-view-flusher", daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self._wake_flusher.wait(self.flush_interval)
+            self._wake_flusher.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Periodic event view flush failed.")
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_event_view_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = EventViewBuffer.from_settings()
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record_event_view(request, event_id):
+    user = request.user.pk if request.user.is_authenticated else None
+    return get_event_view_buffer().record(
+        event_id=event_id,
+        visitor_id=request.COOKIES.get("visitor_id"),
+        user=str(user) if user else None,
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        ip_address=get_client_ip(request),
+    )
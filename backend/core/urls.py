@@ -1,8 +1,13 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import EventViewset
+from .streams import event_stream
+from .views import EventViewset, EventRegistrationViewset
 
 router = DefaultRouter()
+# registered before the empty prefix so "registrations/" isn't taken for an event pk
+router.register("registrations", EventRegistrationViewset, basename="event-registrations")
 router.register("", EventViewset, basename="events")
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path("<uuid:pk>/stream/", event_stream, name="event-stream"),
+] + router.urls
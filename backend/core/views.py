@@ -1,42 +1,211 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
+from user.notifications import notify_registrations
+from user.permissions import CanCreatePaidEvents
+from utilities.choices import EventRegistrationStatusType, RollupGranularityType
+from utilities.geo import bounding_box, covering_cells, distance_expression, within_cells
+from utilities.idempotency import idempotent
+from utilities.tasks import run_on_commit
+from .exports import EXPORT_FORMATS, astream_export, stream_export
+from .filters import AttendeeFilter, EventFilter
 from .models import Event, EventRegistration
+from .pagination import AttendeeExportPagination, AttendeePagination, EventPagination
+from .permissions import CanCancelRegistration
 from .serializers import EventSerializers, EventRegistrationSerializers
+from . import analytics, cache, capacity, search, streams
+from .tracking import record_event_view
 
 
 class EventViewset(viewsets.ModelViewSet):
     serializer_class = EventSerializers.EventRetrieveSerializer
     queryset = Event.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = EventPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = EventFilter
+    replica_actions = {"list", "retrieve", "nearby", "search", "stats", "attendees"}
 
     def create(self, request, *args, **kwargs):
-        user = request.user
-        serialized_data['organizer'] = user.id
         serialized_data = EventSerializers.EventCreateSerializer(data=request.data)
         serialized_data.is_valid(raise_exception=True)
-        
-        event = serialized_data.save()
-        return Response(data=event.data, status=status.HTTP_201_CREATED)
+        CanCreatePaidEvents().check(request, serialized_data.validated_data)
 
-    @action(methods=['GET'], permission_classes=[permissions.IsAuthenticated])
+        event = serialized_data.save(organizer=request.user)
+        return Response(data=EventSerializers.EventRetrieveSerializer(event).data, status=status.HTTP_201_CREATED)
+
+    def list(self, request, *args, **kwargs):
+        return cache.cached_list_response(request, lambda: super(EventViewset, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        event_id = cache.canonical_event_id(kwargs[self.lookup_field])
+        if event_id is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        key, etag = cache.detail_entry(event_id)
+        response = cache.cached_response(request, key, etag, lambda: self.get_serializer(self.get_object()).data)
+        record_event_view(request, event_id)
+        return response
+
+    def perform_update(self, serializer):
+        CanCreatePaidEvents().check(self.request, serializer.validated_data)
+        try:
+            event = serializer.save()
+        except DjangoValidationError as error:
+            raise ValidationError(error.message_dict)
+        # a bigger slot count frees room for waitlisted attendees
+        capacity.promote_waitlist(event.pk)
+
+    def get_attendees(self, request):
+        """Registrations to the organizer's events, narrowed by ?event= and ?status=."""
+        attendees = EventRegistration.objects.filter(event__organizer=request.user)
+        filterset = AttendeeFilter(request.query_params, queryset=attendees)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        return filterset.qs
+
+    @action(methods=['GET'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def attendees(self, request, *args, **kwargs):
-        user = request.user
-        events = EventRegistration.objects.select_related('event').filter(event__organizer=user)
-        serialized_event_attendance = EventRegistrationSerializers.EventRegistrationRetrieveSerializer(events, many=True)
-        return Response(data=serialized_event_attendance.data)
+        attendees = self.get_attendees(request).only("id", "name", "email", "event_id", "status", "created_at")
+
+        paginator = AttendeePagination()
+        page = paginator.paginate_queryset(attendees, request, view=self)
+        serializer = EventRegistrationSerializers.EventRegistrationRetrieveSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False, url_path='attendees/export', permission_classes=[permissions.IsAuthenticated])
+    def export_attendees(self, request, *args, **kwargs):
+        # not ?format=, DRF reserves that one for picking a renderer
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in EXPORT_FORMATS:
+            return Response({"file_format": f"Must be one of {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, _ = EXPORT_FORMATS[file_format]
+        attendees = self.get_attendees(request).order_by(*AttendeeExportPagination.ordering)
+        # an ASGI response must get an async iterator, it reads a sync one into memory first
+        stream = astream_export if isinstance(request._request, ASGIRequest) else stream_export
+        response = StreamingHttpResponse(stream(attendees, file_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="attendees.{file_format}"'
+        return response
+
+    @action(methods=['GET'], detail=False)
+    def nearby(self, request, *args, **kwargs):
+        """Upcoming events within ?radius_km= of ?lat=&lng=, closest first."""
+        params = EventSerializers.NearbyEventsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        lat, lng, radius_km, limit = (params.validated_data[key] for key in ("lat", "lng", "radius_km", "limit"))
+
+        # the covering cells are range scans on the geohash index, the bounding box
+        # trims the cell corners and the exact distance is only computed on what's left
+        in_cells = within_cells(covering_cells(lat, lng, radius_km))
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        in_box = Q(latitude__range=(min_lat, max_lat))
+        if -180 <= min_lng and max_lng <= 180:
+            in_box &= Q(longitude__range=(min_lng, max_lng))
+
+        events = (
+            Event.objects.filter(in_cells, in_box, date__gte=timezone.localdate())
+            .annotate(distance_km=distance_expression(lat, lng))
+            .filter(distance_km__lte=radius_km)
+            .order_by("distance_km", "date", "id")[:limit]
+        )
+
+        events = list(events)
+        results = EventSerializers.EventRetrieveSerializer(events, many=True).data
+        for event, data in zip(events, results):
+            data["distance_km"] = round(event.distance_km, 2)
+        return Response(data=dict(count=len(results), results=results))
 
+    @action(methods=['GET'], detail=False)
+    def search(self, request, *args, **kwargs):
+        """Events matching ?q=, best match first. The last word matches as a prefix, for typeahead."""
+        params = EventSerializers.EventSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
 
-class EventRegistrationViewset(viewsets.ModelViewSet):
+        matches = search.search(params.validated_data["q"], limit=params.validated_data["limit"])
+        results = EventSerializers.EventRetrieveSerializer([event for event, _ in matches], many=True).data
+        for (_, rank), data in zip(matches, results):
+            data["rank"] = round(rank, 2)
+        return Response(data=dict(count=len(results), results=results))
+
+    @action(methods=['GET'], detail=True, permission_classes=[permissions.IsAuthenticated])
+    def stats(self, request, *args, **kwargs):
+        event = self.get_object()
+        if event.organizer_id != request.user.pk:
+            return Response({"detail": "Only the organizer can view event stats."}, status=status.HTTP_403_FORBIDDEN)
+
+        granularity = request.query_params.get("granularity", RollupGranularityType.DAILY).upper()
+        if granularity not in RollupGranularityType.values:
+            return Response({"granularity": f"Must be one of {', '.join(RollupGranularityType.values)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data=analytics.event_stats(event.pk, granularity=granularity))
+
+
+class EventRegistrationViewset(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Anonymous sign-ups. Registrations are listed to the event's organizer
+    only, through EventViewset.attendees, so there's no list, update or
+    delete here: a registration changes status through `cancel`.
+    """
     serializer_class = EventRegistrationSerializers.EventRegistrationRetrieveSerializer
-    queryset = EventRegistration.objects.all()
+    queryset = EventRegistration.objects.select_related("event")
     permission_classes = [permissions.AllowAny]
+    throttle_scopes = {"create": "registrations", "bulk": "bulk_registrations"}
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serialized_data = EventRegistrationSerializers.EventRegistrationCreateSerializer(data=request.data)
         serialized_data.is_valid(raise_exception=True)
-        
-        event = serialized_data.save()
-        return Response(data=dict(message="Your registration was successful", data=event.data), status=status.HTTP_201_CREATED)
+
+        registration, created = capacity.register(serialized_data)
+        response_serializer = EventRegistrationSerializers.EventRegistrationRetrieveSerializer(registration)
+
+        if not created:
+            return Response(data=dict(message="You are already registered for this event", data=response_serializer.data), status=status.HTTP_200_OK)
+
+        run_on_commit(notify_registrations, [registration.pk])
+        if registration.status == EventRegistrationStatusType.WAITLISTED:
+            message = "The event is full, you have been added to the waitlist"
+        else:
+            message = "Your registration was successful"
+        # only in the response that created it, the "already registered" one goes to whoever knows the email
+        return Response(
+            data=dict(message=message, data=response_serializer.data, cancel_token=capacity.cancel_token(registration.pk)),
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(methods=['POST'], detail=False)
+    @idempotent
+    def bulk(self, request, *args, **kwargs):
+        serializer = EventRegistrationSerializers.BulkEventRegistrationCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results, registrations = capacity.register_many(serializer)
+        for result in results:
+            if result["id"] is not None:
+                result["cancel_token"] = capacity.cancel_token(result["id"])
+        if registrations:
+            event_id = serializer.validated_data["event"].pk
+            # bulk_create skips post_save, so do what the registration signals would
+            transaction.on_commit(lambda: cache.invalidate_event_capacity(event_id))
+            transaction.on_commit(lambda: analytics.record_registrations(registrations))
+            run_on_commit(streams.publish_capacity, event_id)
+            run_on_commit(notify_registrations, [registration.pk for registration in registrations])
+
+        return Response(data=dict(message=f"{len(registrations)} of {len(results)} attendee(s) registered", results=results), status=status.HTTP_201_CREATED)
+
+    @action(methods=['POST'], detail=True, permission_classes=[CanCancelRegistration])
+    def cancel(self, request, *args, **kwargs):
+        registration = capacity.cancel(self.get_object().pk)
+        serializer = EventRegistrationSerializers.EventRegistrationRetrieveSerializer(registration)
+        return Response(data=serializer.data)
 
 
@@ -0,0 +1,14 @@
+"""
+Settings for `manage.py test --settings=eventhub.test_settings` and the
+benchmarks, on top of eventhub.settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+# core and user keep no migrations in the repository, the test database is created from their models
+MIGRATION_MODULES = {'core': None, 'user': None}
+
+# run background tasks inline, so none is still writing once its test's rows are flushed
+BACKGROUND_TASKS_EAGER = True
+
+# a request over its query budget fails its test instead of logging a warning
+METRICS_QUERY_BUDGET_STRICT = True
@@ -1,12 +1,11 @@
 from django.contrib import admin
-from leaflet.admin import LeafletGeoAdmin
 
-from .models import User, Profile, UserPreference, Conversation, Message
+from .models import User, Notification, NotificationPreference, UserPreference, Feature, SubscriptionPlan, UserSubscription
 
 
 @admin.register(User)
-class UserAdmin(LeafletGeoAdmin):
+class UserAdmin(admin.ModelAdmin):
     pass
 
 
-admin.site.register([Profile, UserPreference, Conversation, Message])
\ No newline at end of file
+admin.site.register([Notification, NotificationPreference, UserPreference, Feature, SubscriptionPlan, UserSubscription])
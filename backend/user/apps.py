@@ -7,4 +7,5 @@ class UserConfig(AppConfig):
     verbose_name = _("User")
 
     def ready(self):
+        import user.checks
         import user.signals
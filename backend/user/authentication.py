@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def forget_user(user_id):
+    """Drop the cached user, e.g. after it was saved."""
+    cache.delete(user_cache_key(user_id))
+
+
+def revoke_tokens(user_id):
+    """
+    Reject the access tokens issued to the user so far, e.g. after a password
+    change or logout. Kept on the user row rather than in the cache, where it
+    could be evicted or, with a per-process cache, be missed by other workers.
+    """
+    get_user_model().objects.filter(pk=user_id).update(tokens_revoked_at=timezone.now())
+    forget_user(user_id)
+
+
+def is_revoked(user, validated_token):
+    if user.tokens_revoked_at is None:
+        return False
+    # `iat` is in whole seconds, so a token from the second of the revocation may predate it
+    return validated_token.get("iat", 0) <= int(user.tokens_revoked_at.timestamp())
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that doesn't hit the database on every request.
+
+    The token signature and expiry are checked as usual and, for read-only
+    requests, the user comes from a short-lived cache entry instead of the
+    `User` table. Writes still load the user from the database. Tokens issued
+    before a `revoke_tokens` call are rejected in both cases, reads as soon as
+    the cached user is dropped, which takes a cache shared by every process.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise exceptions.AuthenticationFailed(_("Token contained no recognizable user identification"), code="token_not_valid")
+
+        if self.request_method not in SAFE_METHODS:
+            user = super().get_user(validated_token)
+        else:
+            key = user_cache_key(user_id)
+            user = cache.get(key)
+            if user is None:
+                user = super().get_user(validated_token)
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        if is_revoked(user, validated_token):
+            raise exceptions.AuthenticationFailed(_("Token has been revoked"), code="token_not_valid")
+        return user
+
+    def authenticate(self, request):
+        self.request_method = request.method
+        return super().authenticate(request)
@@ -0,0 +1,61 @@
+import threading
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+
+from utilities import versioning
+from .models import Feature, SubscriptionPlan
+
+VERSION_KEY = "plan-catalog:version"
+
+_lock = threading.Lock()
+_catalog = None
+
+
+class PlanCatalog:
+    """Every subscription plan with its features, loaded once and shared by all requests of a process."""
+
+    def __init__(self, version):
+        self.version = version
+        self.plans = {
+            plan.pk: plan
+            for plan in SubscriptionPlan.objects.prefetch_related(
+                Prefetch("features", queryset=Feature.objects.order_by("name"))
+            ).order_by("price", "name")
+        }
+
+        from .serializers import SubscriptionPlanSerializer
+        self.data = SubscriptionPlanSerializer(self.plans.values(), many=True).data
+
+
+def get_version():
+    return versioning.get_version(VERSION_KEY)
+
+
+def invalidate():
+    """Make every process reload the catalog, the version lives in the shared cache."""
+    versioning.bump_version(VERSION_KEY)
+
+
+def get_catalog():
+    """
+    The current catalog, costs one cache read while no plan or feature
+    changed and a reload of the plans (2 queries) once one did.
+    """
+    global _catalog
+    version = get_version()
+    catalog = _catalog
+    if catalog is None or catalog.version != version:
+        with _lock:
+            if _catalog is None or _catalog.version != version:
+                _catalog = PlanCatalog(version)
+            catalog = _catalog
+    return catalog
+
+
+def get_plan(plan_id):
+    """The catalog's plan for `plan_id`, None for unknown or malformed ids."""
+    try:
+        plan_id = SubscriptionPlan._meta.pk.to_python(plan_id)
+    except ValidationError:
+        return None
+    return get_catalog().plans.get(plan_id)
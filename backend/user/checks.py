@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.security, deploy=True)
+def check_shared_user_cache(app_configs, **kwargs):
+    """Cached users are only dropped from the process that revoked their tokens unless the cache is shared."""
+    if settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "The default cache is local to each process, so other workers keep authenticating "
+            "reads with revoked access tokens from their cached user until it expires.",
+            hint=f"Set REDIS_URL, or AUTH_USER_CACHE_TIMEOUT (now {settings.AUTH_USER_CACHE_TIMEOUT} s) to 0.",
+            id="user.W001",
+        )
+    ]
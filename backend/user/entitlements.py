@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import catalog
+from .models import UserSubscription
+
+
+def _cache_key(user_id, catalog_version):
+    # keyed by the catalog version too, so editing a plan's features re-resolves everyone on it
+    return f"entitlements:{user_id}:{catalog_version}"
+
+
+def active_features(user_id):
+    """
+    Names of the features the user's subscription grants, an empty frozenset
+    without one or once it ended. Resolved once per ENTITLEMENT_CACHE_TIMEOUT,
+    or until the subscription ends if that comes first, from then on a
+    couple of cache reads.
+    """
+    version = catalog.get_version()
+    key = _cache_key(user_id, version)
+    features = cache.get(key)
+    if features is not None:
+        return features
+
+    timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+    subscription = UserSubscription.objects.filter(user_id=user_id).values_list("subscription_plan_id", "end_date").first()
+    plan = catalog.get_catalog().plans.get(subscription[0]) if subscription else None
+    now = timezone.now()
+    if plan is None or subscription[1] <= now:
+        features = frozenset()
+    else:
+        features = frozenset(feature.name for feature in plan.features.all())
+        timeout = min(timeout, int((subscription[1] - now).total_seconds()) + 1)
+
+    cache.set(key, features, timeout)
+    return features
+
+
+def has_feature(user, feature):
+    return user.is_authenticated and feature in active_features(user.pk)
+
+
+def invalidate(user_id):
+    cache.delete(_cache_key(user_id, catalog.get_version()))
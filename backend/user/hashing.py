@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException
+
+# kept free of model imports, spawned workers import this module before Django is set up
+
+_slots = None
+_slots_lock = threading.Lock()
+_held = threading.local()
+
+
+class PasswordHashingBusy(APIException):
+    status_code = 503
+    default_detail = _("Too many sign-ins at once, try again in a moment.")
+    default_code = "password_hashing_busy"
+    wait = 1 # sent as Retry-After
+
+
+class Slots:
+    """
+    A semaphore that serves waiters first come, first served. A released
+    slot is handed to the longest waiting thread, so a client logging in
+    again right away can't jump the queue and starve the others.
+    """
+
+    def __init__(self, size):
+        self.free = size
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        with self.lock:
+            if self.free and not self.waiters:
+                self.free -= 1
+                return True
+            waiter = threading.Event()
+            self.waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self.lock:
+            # handed a slot between the timeout and taking the lock
+            if waiter.is_set():
+                return True
+            self.waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.free += 1
+
+
+def get_slots():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = Slots(settings.PASSWORD_HASHING_CONCURRENCY or os.cpu_count())
+    return _slots
+
+
+@contextmanager
+def hashing_slot():
+    """
+    Hold one of the PASSWORD_HASHING_CONCURRENCY slots while hashing a
+    password. Hashers are built to be slow, and Argon2 takes 100 MiB per
+    hash, so past one hash per core more concurrent ones only add latency
+    and memory. Raises PasswordHashingBusy when no slot frees up within
+    PASSWORD_HASHING_TIMEOUT seconds. Reentrant, a check that upgrades the
+    hash hashes again under the same slot.
+    """
+    if getattr(_held, "slot", False):
+        yield
+        return
+    slots = get_slots()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise PasswordHashingBusy()
+    _held.slot = True
+    try:
+        yield
+    finally:
+        _held.slot = False
+        slots.release()
+
+
+def _setup_worker():
+    import django
+
+    django.setup()
+
+
+def hashing_pool(workers=None):
+    """
+    Processes to run password hashers on. hashlib and argon2-cffi release the
+    GIL while hashing, but the Python around each hash doesn't, and a batch
+    of imports shouldn't compete with the importing thread for it. Spawned
+    rather than forked so workers don't inherit database connections or threads.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_setup_worker,
+    )
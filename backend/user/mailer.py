@@ -0,0 +1,123 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from utilities.choices import EmailStatusType
+from utilities.tasks import run_on_commit
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# how long a worker owns the emails it picked before another worker may retry them
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def queue_email(to_email, subject, body, from_email=None, html_body=None):
+    """Persist an email to the outbox and kick off delivery once the transaction commits."""
+    email = OutboundEmail.objects.create(
+        to_email=to_email,
+        from_email=from_email,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+    )
+    run_on_commit(deliver_pending)
+    return email
+
+
+def queue_emails(emails):
+    """Bulk variant of `queue_email` for unsaved `OutboundEmail` instances."""
+    emails = OutboundEmail.objects.bulk_create(emails)
+    run_on_commit(deliver_pending)
+    return emails
+
+
+def _claim_due(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatusType.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return emails
+
+
+def _within_rate_limit(domain):
+    """Fixed one-minute window per recipient domain, counted in the shared cache."""
+    key = f"mail-rate:{domain}:{int(timezone.now().timestamp() // 60)}"
+    cache.add(key, 0, 60)
+    try:
+        return cache.incr(key) <= settings.EMAIL_DOMAIN_RATE_LIMIT
+    except ValueError:
+        return True
+
+
+def _defer(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = EmailStatusType.FAILED
+        logger.error(f"Giving up on email {email.pk} to {email.to_email} after {email.attempts} attempts: {error}")
+    else:
+        email.next_attempt_at = now + timedelta(seconds=settings.EMAIL_RETRY_BACKOFF * 2 ** (email.attempts - 1))
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "updated_at"])
+
+
+def deliver_pending(batch_size=None):
+    """
+    Send one batch of due emails over a single SMTP connection, returns the
+    number sent. Failures are retried with exponential backoff and emails to
+    a domain over its per-minute rate limit wait for the next window.
+    """
+    emails = _claim_due(batch_size or settings.EMAIL_QUEUE_BATCH_SIZE)
+    if not emails:
+        return 0
+
+    now = timezone.now()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        logger.exception("Could not connect to the mail server.")
+        for email in emails:
+            _defer(email, error, now)
+        return 0
+
+    sent_ids = []
+    rate_limited_ids = []
+    try:
+        for email in emails:
+            if not _within_rate_limit(email.domain):
+                rate_limited_ids.append(email.pk)
+                continue
+
+            message = EmailMultiAlternatives(
+                email.subject, email.body, email.from_email or settings.DEFAULT_FROM_EMAIL, [email.to_email],
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, "text/html")
+
+            try:
+                connection.send_messages([message])
+            except Exception as error:
+                logger.warning(f"Sending email {email.pk} to {email.to_email} failed: {error}")
+                _defer(email, error, now)
+            else:
+                sent_ids.append(email.pk)
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.filter(pk__in=sent_ids).update(status=EmailStatusType.SENT, sent_at=now, updated_at=now)
+    if rate_limited_ids:
+        next_window = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        OutboundEmail.objects.filter(pk__in=rate_limited_ids).update(next_attempt_at=next_window)
+
+    logger.info(f"Sent {len(sent_ids)} email(s), {len(rate_limited_ids)} deferred by rate limits.")
+    return len(sent_ids)
@@ -0,0 +1,25 @@
+import csv
+import time
+from django.core.management.base import BaseCommand
+
+from user.onboarding import import_users
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV file with email, first_name, last_name and optional username and password columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, with a header row.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Number of users created per transaction.")
+        parser.add_argument("--workers", type=int, default=None, help="Password hashing processes, one per CPU by default.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with open(options["path"], newline="", encoding="utf-8-sig") as file:
+            counts = import_users(csv.DictReader(file), chunk_size=options["chunk_size"], workers=options["workers"])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['created']} user(s) in {elapsed:.1f}s ({counts['created'] / elapsed:.0f}/s), "
+            f"skipped {counts['existing']} existing and {counts['invalid']} invalid row(s)."
+        ))
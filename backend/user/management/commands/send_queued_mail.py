@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from user.mailer import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound emails, once or continuously with --loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="Keep polling the outbox.")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to sleep when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent = deliver_pending(batch_size=options["batch_size"])
+            if sent:
+                self.stdout.write(f"Sent {sent} email(s).")
+
+            if not options["loop"]:
+                break
+            if not sent:
+                close_old_connections()
+                time.sleep(options["interval"])
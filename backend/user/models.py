@@ -1,10 +1,15 @@
-from django.contrib.gis.db import models
+from django.db import models
+from django.db.models.functions import Lower
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
-from django.core.mail import send_mail
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 from django_countries.fields import CountryField
+from user.hashing import hashing_slot
 from user.manager import CustomUserManager
+from utilities.geo import encode_geohash
 from utilities.utils import BaseModelMixin
-from utilities.choices import GenderType, NotificationType, SubscriptionPlanType
+from utilities.choices import EmailStatusType, GenderType, NotificationType, SubscriptionPlanType
 
 
 class User(BaseModelMixin, AbstractUser):
@@ -18,6 +23,10 @@ class User(BaseModelMixin, AbstractUser):
     is_active = models.BooleanField(default=True)
     is_verified = models.BooleanField(default=False)
     gender = models.CharField(max_length=10, choices=GenderType.choices, null=True, blank=True)
+    # denormalized so the unread badge never COUNT(*)s notifications, see user.notifications
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+    # access tokens issued up to then are rejected, see user.authentication.revoke_tokens
+    tokens_revoked_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
@@ -26,21 +35,50 @@ class User(BaseModelMixin, AbstractUser):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # registrations keep emails as typed, accounts are looked up by them case-insensitively
+            models.Index(Lower("email"), name="user_email_lower_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # unread_notifications and tokens_revoked_at are only ever written with UPDATEs,
+        # a plain save must not overwrite them with the (possibly stale) in-memory values
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ("unread_notifications", "tokens_revoked_at")
+            ]
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        with hashing_slot():
+            super().set_password(raw_password)
+
+    def check_password(self, raw_password):
+        upgraded = []
+
+        def setter(raw_password):
+            # the hash was made by a hasher other than the first of PASSWORD_HASHERS, or with older settings
+            self.set_password(raw_password)
+            self._password = None
+            upgraded.append(True)
+
+        with hashing_slot():
+            valid = check_password(raw_password, self.password, setter)
+        # saved once the slot is free for the next login
+        if upgraded:
+            self.save(update_fields=["password"])
+        return valid
 
     @property
     def fullname(self):
         return f"{self.first_name} {self.last_name}"
 
     def email_user(self, subject, message, from_email=None, **kwargs):
-        """Send an email to this user."""
-        send_mail(
-            subject,
-            message,
-            from_email,
-            [self.email],
-            fail_silently=True,
-            **kwargs,
-        )
+        """Queue an email to this user, delivered out of band by `user.mailer`."""
+        from user.mailer import queue_email
+
+        return queue_email(self.email, subject, message, from_email, html_body=kwargs.get("html_message"))
 
 
 class Notification(BaseModelMixin):
@@ -55,12 +93,60 @@ class Notification(BaseModelMixin):
     }
     """
 
+    class Meta(BaseModelMixin.Meta):
+        indexes = [
+            # the inbox, unread first and newest first, see user.pagination
+            models.Index(fields=["receiver", "is_read", "-created_at", "-id"], name="notification_inbox_idx"),
+        ]
+
+class OutboundEmail(BaseModelMixin):
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=254, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=EmailStatusType.choices, default=EmailStatusType.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(BaseModelMixin.Meta):
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbound_email_due_idx"),
+        ]
+
+    @property
+    def domain(self):
+        return self.to_email.rsplit("@", 1)[-1].lower()
+
+
 class NotificationPreference(BaseModelMixin):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notification_preference")
     receive_email_notification_about_own_events = models.BooleanField(default=True)
     receiver_marketing_email = models.BooleanField(default=False)
     receive_registration_notifications = models.BooleanField(default=True)
     receive_event_reminders = models.BooleanField(default=True) 
+    receive_nearby_event_notifications = models.BooleanField(default=True)
+
+
+class UserPreference(BaseModelMixin):
+    """Where a user is and how far away new events may be for them to hear about them."""
+    MAX_NOTIFY_RADIUS_KM = 500
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="preference")
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # derived from latitude/longitude on save, new events are matched to users through it, see user.notifications
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False, db_index=True)
+    notify_radius_km = models.PositiveIntegerField(default=MAX_NOTIFY_RADIUS_KM, validators=[MaxValueValidator(MAX_NOTIFY_RADIUS_KM)])
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ""
+        super().save(*args, **kwargs)
 
 
 class Feature(BaseModelMixin):
@@ -0,0 +1,168 @@
+import logging
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.models import Event, EventRegistration
+from utilities.choices import NotificationType
+from utilities.geo import bounding_box, covering_cells, distance_expression, within_cells
+from utilities.pubsub import get_broker
+from utilities.utils import chunked
+from .models import Notification, User, UserPreference
+from .serializers import UserSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def opted_in(users, preference_field):
+    """Users without a NotificationPreference row keep the defaults, which are opted in."""
+    return users.exclude(**{f"notification_preference__{preference_field}": False})
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def fan_out(receiver_ids, type, metadata):
+    """
+    Write one notification per receiver, `NOTIFICATION_FANOUT_CHUNK_SIZE`
+    rows per transaction so a large audience never holds one huge one, and
+    push them to the receivers with a stream open once they're committed.
+    """
+    created = 0
+    for chunk in chunked(receiver_ids, settings.NOTIFICATION_FANOUT_CHUNK_SIZE):
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(
+                [Notification(receiver_id=receiver_id, type=type, metadata=metadata) for receiver_id in chunk]
+            )
+            _add_unread(chunk)
+            transaction.on_commit(lambda notifications=notifications: push(notifications))
+        created += len(chunk)
+    return created
+
+
+def push(notifications):
+    broker = get_broker()
+    notifications = [notification for notification in notifications if broker.has_subscribers(user_channel(notification.receiver_id))]
+    if not notifications:
+        return
+    data = UserSerializer.NotificationSerializer(notifications, many=True).data
+    broker.publish_many(
+        (user_channel(notification.receiver_id), dict(event="notification", data=item))
+        for notification, item in zip(notifications, data)
+    )
+
+
+def _add_unread(receiver_ids):
+    # one UPDATE per distinct multiplicity, a single one unless a receiver is listed twice
+    by_count = defaultdict(list)
+    for receiver_id, count in Counter(receiver_ids).items():
+        by_count[count].append(receiver_id)
+    for count, ids in by_count.items():
+        User.objects.filter(pk__in=ids).update(unread_notifications=F("unread_notifications") + count)
+
+
+def unread_count(user_id):
+    return User.objects.filter(pk=user_id).values_list("unread_notifications", flat=True).first() or 0
+
+
+@transaction.atomic()
+def mark_read(user_id, notification_ids=None):
+    """
+    Mark the user's unread notifications read, all of them or those in
+    `notification_ids`, and take them off the unread counter. Returns how
+    many changed.
+    """
+    notifications = Notification.objects.filter(receiver_id=user_id, is_read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(pk__in=notification_ids)
+
+    # only rows that were unread are updated, so a notification is never subtracted twice
+    marked = notifications.update(is_read=True, updated_at=timezone.now())
+    if marked:
+        User.objects.filter(pk=user_id).update(unread_notifications=Greatest(F("unread_notifications") - marked, 0))
+        transaction.on_commit(lambda: push_unread(user_id))
+    return marked
+
+
+def push_unread(user_id):
+    """Sync the badge of the user's other open streams after notifications were read."""
+    channel = user_channel(user_id)
+    broker = get_broker()
+    if broker.has_subscribers(channel):
+        broker.publish(channel, dict(event="unread", data=dict(unread=unread_count(user_id))))
+
+
+def notify_registrations(registration_ids):
+    """Tell each organizer about new registrations to their events, one notification per event."""
+    registrations = (
+        EventRegistration.objects.filter(pk__in=registration_ids)
+        .select_related("event")
+        .only("name", "event__id", "event__title", "event__organizer_id")
+    )
+    by_event = {}
+    for registration in registrations:
+        by_event.setdefault(registration.event, []).append(registration.name)
+
+    organizers = set(
+        opted_in(User.objects.filter(pk__in={event.organizer_id for event in by_event}), "receive_registration_notifications")
+        .values_list("pk", flat=True)
+    )
+
+    created = 0
+    for event, names in by_event.items():
+        if event.organizer_id not in organizers:
+            continue
+
+        if len(names) == 1:
+            message = f"{names[0]} registered for {event.title}"
+        else:
+            message = f"{len(names)} people registered for {event.title}"
+        created += fan_out(
+            [event.organizer_id],
+            NotificationType.EVENT_REGISTRATION,
+            dict(message=message, event_id=str(event.pk), registrations=len(names)),
+        )
+    return created
+
+
+def nearby_users(latitude, longitude):
+    """
+    Ids of the users whose notification radius covers the point. Only users
+    in the geohash cells around the point, out to the largest radius anyone
+    can pick, are read, and the exact distance is checked in the database.
+    """
+    radius_km = UserPreference.MAX_NOTIFY_RADIUS_KM
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    preferences = UserPreference.objects.filter(
+        within_cells(covering_cells(latitude, longitude, radius_km)),
+        latitude__range=(min_lat, max_lat),
+    )
+    if -180 <= min_lng and max_lng <= 180:
+        preferences = preferences.filter(longitude__range=(min_lng, max_lng))
+
+    return (
+        preferences.annotate(distance_km=distance_expression(latitude, longitude))
+        .filter(distance_km__lte=F("notify_radius_km"))
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=settings.NOTIFICATION_FANOUT_CHUNK_SIZE)
+    )
+
+
+def notify_nearby_users(event_id):
+    """Tell the users around a newly published event about it, except its organizer."""
+    event = Event.objects.only("id", "title", "city", "latitude", "longitude", "organizer_id").get(pk=event_id)
+    if event.latitude is None or event.longitude is None:
+        return 0
+
+    metadata = dict(message=f"{event.title} is happening near you in {event.city}", event_id=str(event.pk))
+    created = 0
+    for chunk in chunked(nearby_users(event.latitude, event.longitude), settings.NOTIFICATION_FANOUT_CHUNK_SIZE):
+        receivers = opted_in(User.objects.filter(pk__in=chunk), "receive_nearby_event_notifications").exclude(pk=event.organizer_id)
+        created += fan_out(list(receivers.values_list("pk", flat=True)), NotificationType.NEW_EVENT_NEARBY, metadata)
+
+    logger.info(f"Sent {created} {NotificationType.NEW_EVENT_NEARBY} notification(s) for event {event_id}.")
+    return created
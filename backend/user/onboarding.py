@@ -0,0 +1,106 @@
+import logging
+import os
+from collections import Counter
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from utilities.utils import chunked
+from .hashing import hashing_pool
+from .models import User, UserPreference
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("email", "first_name", "last_name")
+TEXT_FIELDS = REQUIRED_FIELDS + ("username",)
+
+
+def import_users(rows, chunk_size=1000, workers=None):
+    """
+    Create users from dicts with "email", "first_name", "last_name" and
+    optional "username" and "password", `chunk_size` users per transaction.
+
+    Passwords are hashed on a pool of `workers` processes, the hashing of a
+    chunk overlapping the inserts of the previous one, and users and their
+    preferences are written with `bulk_create`. Rows whose email or
+    username is taken, or repeated, are skipped, as are rows missing a
+    required field. Rows without a password get an unusable one, those
+    users set theirs through the password reset. Returns the number of
+    users created, existing and invalid rows.
+    """
+    counts = Counter(created=0, existing=0, invalid=0)
+    emails, usernames = set(), set()
+    workers = workers or os.cpu_count()
+
+    with hashing_pool(workers) as executor:
+        pending = None
+        for chunk in chunked(rows, chunk_size):
+            users, passwords = _prepare(chunk, emails, usernames, counts)
+            to_hash = [password for password in passwords if password]
+            hashes = executor.map(make_password, to_hash, chunksize=max(1, len(to_hash) // (4 * workers)))
+            if pending is not None:
+                counts["created"] += _create(*pending)
+            pending = (users, passwords, hashes)
+        if pending is not None:
+            counts["created"] += _create(*pending)
+
+    logger.info(f"Imported {counts['created']} user(s), skipped {counts['existing']} existing and {counts['invalid']} invalid row(s).")
+    return counts
+
+
+def _prepare(chunk, emails, usernames, counts):
+    """Users of the chunk that can be created, and the passwords to hash, same order."""
+    candidates = []
+    for row in chunk:
+        if not _clean(row):
+            counts["invalid"] += 1
+            continue
+        candidates.append(row)
+
+    taken_emails = set(User.objects.filter(email__in=[row["email"] for row in candidates]).values_list("email", flat=True))
+    taken_usernames = set(
+        User.objects.filter(username__in=[row["username"] for row in candidates if row["username"]]).values_list("username", flat=True)
+    )
+
+    users, passwords = [], []
+    for row in candidates:
+        email, username = row["email"], row["username"] or None
+        if email in emails or email in taken_emails or (username and (username in usernames or username in taken_usernames)):
+            counts["existing"] += 1
+            continue
+        emails.add(email)
+        if username:
+            usernames.add(username)
+        users.append(User(email=email, username=username, first_name=row["first_name"], last_name=row["last_name"]))
+        passwords.append(row.get("password") or None)
+    return users, passwords
+
+
+def _clean(row):
+    """Tidy the row in place, False if it can't be imported."""
+    for field in TEXT_FIELDS:
+        row[field] = (row.get(field) or "").strip()
+        if len(row[field]) > User._meta.get_field(field).max_length:
+            return False
+    if not all(row[field] for field in REQUIRED_FIELDS):
+        return False
+    row["email"] = User.objects.normalize_email(row["email"])
+    try:
+        validate_email(row["email"])
+    except ValidationError:
+        return False
+    return True
+
+
+def _create(users, passwords, hashes):
+    hashes = iter(hashes)
+    for user, password in zip(users, passwords):
+        user.password = next(hashes) if password else make_password(None)
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        # bulk_create skips post_save, so do what create_user_related_models would
+        UserPreference.objects.bulk_create(
+            [UserPreference(user=user, notify_radius_km=UserPreference.MAX_NOTIFY_RADIUS_KM) for user in users]
+        )
+    return len(users)
@@ -0,0 +1,6 @@
+from utilities.pagination import KeysetPagination
+
+
+class NotificationPagination(KeysetPagination):
+    # unread first, newest first, matches notification_inbox_idx
+    ordering = ("is_read", "-created_at", "-id")
@@ -0,0 +1,32 @@
+from rest_framework import exceptions
+
+from utilities.choices import FeatureType
+from .entitlements import has_feature
+
+
+class RequiresFeature:
+    """
+    Allow a write only if the user's subscription includes `feature`, where
+    `applies` says the data needs it. Goes by the serializer's validated data,
+    so views call `check` once it's valid rather than listing this in
+    `permission_classes`, which sees the raw body.
+    """
+    feature = None
+    message = None
+
+    def applies(self, data):
+        return True
+
+    def check(self, request, data):
+        if self.applies(data) and not has_feature(request.user, self.feature):
+            raise exceptions.PermissionDenied(self.message)
+
+
+class CanCreatePaidEvents(RequiresFeature):
+    """Making an event paid, whether creating it that way or switching it over later."""
+    feature = FeatureType.PAID_EVENTS
+    message = "Your subscription plan doesn't include paid events."
+
+    def applies(self, data):
+        # validated, the body may spell it "True" or "yes", or not be an object at all
+        return data.get("is_paid") is True
@@ -2,12 +2,13 @@ import logging
 from typing import Dict, Any
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as SimpleJWTTokenObtainPairSerializer
 from django_countries.fields import Country
 from django_countries.serializer_fields import CountryField
 
+from .authentication import revoke_tokens
 from .models import Notification, NotificationPreference, Feature, UserSubscription, SubscriptionPlan
 
 
@@ -74,7 +75,7 @@ class UserSerializer:
                 user_id, token = token.split(":", 1)
                 
                 user = User.objects.get(id=user_id)
-            except (ValueError, User.DoesNotExist):
+            except (ValueError, DjangoValidationError, User.DoesNotExist):
                 raise serializers.ValidationError({"token": "Invalid token."})
 
             token_generator = PasswordResetTokenGenerator()
@@ -91,6 +92,7 @@ class UserSerializer:
             """
             self.user.set_password(self.validated_data["new_password"])
             self.user.save()
+            revoke_tokens(self.user.pk)
 
     class ChangePasswordSerializer(serializers.Serializer):
         old_password = serializers.CharField(required=True, write_only=True)
@@ -105,7 +107,7 @@ class UserSerializer:
             user = self.context['request'].user
             old_password = attrs.get('old_password')
 
-            is_password_valid = check_password(old_password, user.password)
+            is_password_valid = user.check_password(old_password)
             
             if not is_password_valid: 
                 raise serializers.ValidationError({"old_password": "Invalid password."})
@@ -119,6 +121,7 @@ class UserSerializer:
             user = self.context['request'].user
             user.set_password(self.validated_data["new_password"])
             user.save()
+            revoke_tokens(user.pk)
             return user
 
     class NotificationPreferenceSerializer(serializers.ModelSerializer):
@@ -143,24 +146,24 @@ class UserSerializer:
             fields = (
                 "id",
                 "receiver",
+                "type",
                 "is_read",
-                "metadata"
+                "metadata",
+                "created_at"
             )
 
-    class ReadNotificationSerializer(serializers.ModelSerializer):
-        
-        class Meta:
-            model = Notification
-            fields = (
-                "id"
-            )
+    class ReadNotificationsSerializer(serializers.Serializer):
+        ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
 
     class UserSubscriptionSerializer(serializers.ModelSerializer):
-        subscription_plan = SubscriptionPlanSerializer()
+        # plans change through upgrade_subscription/downgrade_subscription, never by writing them here
+        subscription_plan = SubscriptionPlanSerializer(read_only=True)
+        start_date = serializers.DateTimeField(source="created_at", read_only=True)
 
         class Meta:
             model = UserSubscription
             fields = ['id', 'user', 'subscription_plan', 'start_date', 'end_date']
+            read_only_fields = ['user', 'end_date']
 
             
 class TokenObtainSerializer(SimpleJWTTokenObtainPairSerializer):
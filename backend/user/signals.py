@@ -1,16 +1,36 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import User, Profile, UserPreference
+from . import catalog, entitlements
+from .authentication import forget_user
+from .models import Feature, SubscriptionPlan, User, UserPreference, UserSubscription
 
 
 @receiver(post_save, sender=User)
 def create_user_related_models(sender, instance, created, **kwargs):
     if created:
-        # Create Profile
-        Profile.objects.create(user=instance)
-
         # Create NotificationSetting with default radius (optional)
         UserPreference.objects.create(
             user=instance,
-            notify_radius_km=500
+            notify_radius_km=UserPreference.MAX_NOTIFY_RADIUS_KM
         )
+
+
+@receiver(post_save, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(m2m_changed, sender=SubscriptionPlan.features.through)
+def invalidate_plan_catalog(sender, **kwargs):
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_entitlements(sender, instance, **kwargs):
+    transaction.on_commit(lambda: entitlements.invalidate(instance.user_id))
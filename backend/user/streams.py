@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from utilities.pubsub import asgi_only, run_sync, sse_response
+from .authentication import CachedJWTAuthentication
+from .models import User
+from .notifications import unread_count, user_channel
+
+_ticket_signer = signing.TimestampSigner(salt="user.streams.ticket")
+
+
+def issue_ticket(user_id):
+    """
+    A ticket opening the user's notification stream, once and within
+    NOTIFICATION_STREAM_TICKET_MAX_AGE seconds. Browsers' EventSource can't
+    set headers, so the URL carries it, and URLs end up in logs, where an
+    access token would stay usable for its whole lifetime.
+    """
+    return _ticket_signer.sign(str(user_id))
+
+
+def redeem_ticket(ticket):
+    """The id of the user a valid, unused ticket was issued to, None otherwise."""
+    max_age = settings.NOTIFICATION_STREAM_TICKET_MAX_AGE
+    try:
+        user_id = _ticket_signer.unsign(ticket, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    # only the first add() of a key succeeds, so a replayed ticket is refused
+    if not cache.add(f"stream-ticket:{ticket}", 1, max_age + 1):
+        return None
+    return user_id
+
+
+def authenticate(request):
+    """
+    The user of the request's `ticket` query parameter, see issue_ticket, or
+    of the access token in the Authorization header.
+    """
+    ticket = request.GET.get("ticket")
+    if ticket is not None:
+        user_id = redeem_ticket(ticket)
+        return User.objects.filter(pk=user_id).first() if user_id else None
+
+    authentication = CachedJWTAuthentication()
+    authentication.request_method = request.method
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, exceptions.AuthenticationFailed):
+        return None
+
+
+@asgi_only
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's new notifications, "notification"
+    events, and of their unread count, "unread" events, starting with the
+    current count.
+    """
+    user = await run_sync(authenticate, request)
+    if user is None or not user.is_active:
+        return JsonResponse(dict(detail="Authentication credentials were not provided or are invalid."), status=401)
+
+    unread = await run_sync(unread_count, user.pk)
+    return sse_response([user_channel(user.pk)], initial=[("unread", dict(unread=unread))])
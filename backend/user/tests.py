@@ -0,0 +1,336 @@
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.contrib.auth.models import AnonymousUser
+from django.core.mail.backends import locmem
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utilities.choices import EmailStatusType, NotificationType
+from utilities.metrics import QueryBudgetExceeded
+from utilities.throttling import UserRateThrottle
+from .authentication import revoke_tokens
+from .mailer import deliver_pending, queue_email
+from .notifications import fan_out, mark_read
+from .streams import authenticate
+from .views import SubscriptionPlanViewSet
+from .models import Notification, OutboundEmail, SubscriptionPlan, User, UserSubscription
+
+
+def create_user(email="ada@example.com"):
+    return User.objects.create_user(email=email, password=None, username=email.split("@")[0], first_name="Ada", last_name="Obi")
+
+
+class SlowEmailBackend(locmem.EmailBackend):
+    """
+    The locmem backend behind a slow mail server, which refuses the addresses
+    in `refused`. Like the SMTP backend, sending without opening the
+    connection first connects for that one call.
+    """
+    connect_delay = 0.2
+    refused = set()
+    connections = 0
+    connected = False
+
+    def open(self):
+        if self.connected:
+            return False
+        SlowEmailBackend.connections += 1
+        time.sleep(self.connect_delay)
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            for message in messages:
+                if set(message.to) & self.refused:
+                    raise OSError("Mailbox unavailable")
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+@override_settings(EMAIL_BACKEND="user.tests.SlowEmailBackend", BACKGROUND_TASKS_EAGER=False)
+class MailQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        SlowEmailBackend.connections = 0
+        SlowEmailBackend.refused = set()
+        self.user = create_user()
+
+    def test_password_reset_queues_the_email_instead_of_sending_it(self):
+        response = self.client.post(reverse("users-reset-password"), {"email": self.user.email})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mail.outbox, [])
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.to_email, email.status), (self.user.email, EmailStatusType.PENDING))
+
+        self.assertEqual(deliver_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatusType.SENT)
+
+    def test_request_latency_with_and_without_the_queue(self):
+        start = time.perf_counter()
+        send_mail("Password Reset Request", "body", None, [self.user.email])
+        synchronous = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.client.post(reverse("users-reset-password"), {"email": self.user.email})
+        queued = time.perf_counter() - start
+
+        # sending inline waits on the mail server, the queue only writes a row
+        self.assertGreaterEqual(synchronous, SlowEmailBackend.connect_delay)
+        self.assertLess(queued, SlowEmailBackend.connect_delay)
+
+    def test_a_batch_is_sent_over_one_connection(self):
+        for index in range(5):
+            queue_email(f"attendee{index}@example.com", "Hello", "body")
+
+        self.assertEqual(deliver_pending(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(SlowEmailBackend.connections, 1)
+
+    @override_settings(EMAIL_MAX_ATTEMPTS=3, EMAIL_RETRY_BACKOFF=60)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        SlowEmailBackend.refused = {"bounce@example.com"}
+        email = queue_email("bounce@example.com", "Hello", "body")
+
+        for attempt, backoff in ((1, 60), (2, 120)):
+            before = timezone.now()
+            self.assertEqual(deliver_pending(), 0)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (EmailStatusType.PENDING, attempt))
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=backoff))
+            self.assertEqual(deliver_pending(), 0, "retried before its backoff ran out")
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+
+        deliver_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailStatusType.FAILED, 3))
+        self.assertIn("Mailbox unavailable", email.last_error)
+
+    @override_settings(EMAIL_DOMAIN_RATE_LIMIT=3)
+    def test_domain_over_its_rate_limit_is_deferred_to_the_next_minute(self):
+        for index in range(5):
+            queue_email(f"attendee{index}@busy.example", "Hello", "body")
+        queue_email("someone@quiet.example", "Hello", "body")
+
+        # mid-minute, so the rate limit window can't roll over during the test
+        now = (timezone.now() + timedelta(minutes=1)).replace(second=30)
+        with mock.patch("user.mailer.timezone.now", return_value=now):
+            self.assertEqual(deliver_pending(), 4)
+
+        deferred = OutboundEmail.objects.filter(status=EmailStatusType.PENDING)
+        self.assertEqual(deferred.count(), 2)
+        self.assertTrue(all(email.domain == "busy.example" for email in deferred))
+        self.assertEqual(set(deferred.values_list("next_attempt_at", flat=True)), {now.replace(second=0, microsecond=0) + timedelta(minutes=1)})
+
+
+class NotificationQueryTests(APITestCase):
+    """The badge and inbox cost the same few queries however many notifications there are."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        # bearer auth, so reads authenticate from the user cache as in production
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.client.get(reverse("users-me"))
+
+    def notify(self, count):
+        fan_out([self.user.pk] * count, NotificationType.NEW_EVENT_NEARBY, dict(message="Jazz night near you"))
+
+    def test_unread_count_is_one_query(self):
+        for count in (1, 50):
+            self.notify(count)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("users-unread-notifications-count"))
+            self.assertEqual(response.data["unread"], Notification.objects.filter(receiver=self.user, is_read=False).count())
+
+    def test_every_inbox_page_is_one_query(self):
+        self.notify(45)
+        mark_read(self.user.pk, list(Notification.objects.values_list("pk", flat=True)[:5]))
+
+        seen = []
+        url = f"{reverse('users-notifications')}?page_size=20"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            seen += response.data["results"]
+            url = response.data["next"]
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len({notification["id"] for notification in seen}), 45)
+        # unread first
+        self.assertEqual([notification["is_read"] for notification in seen], [False] * 40 + [True] * 5)
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.client.get(reverse("users-me")).status_code, status.HTTP_200_OK)
+
+    def test_revocation_outlives_the_cache(self):
+        revoke_tokens(self.user.pk)
+        # evicted or another process's cache, either way nothing cached to go by
+        cache.clear()
+        self.assertEqual(self.client.get(reverse("users-me")).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(reverse("users-mark-all-notifications-read")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # a plain save of an instance loaded earlier doesn't undo it
+        self.user.first_name = "Ada Lovelace"
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("users-me")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_from_the_second_of_the_revocation_are_revoked(self):
+        token = AccessToken.for_user(self.user)
+        issued = datetime.fromtimestamp(token["iat"], tz=timezone.get_current_timezone())
+        User.objects.filter(pk=self.user.pk).update(tokens_revoked_at=issued + timedelta(milliseconds=500))
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(self.client.get(reverse("users-me")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        User.objects.filter(pk=self.user.pk).update(tokens_revoked_at=issued - timedelta(seconds=1))
+        cache.clear()
+        self.assertEqual(self.client.get(reverse("users-me")).status_code, status.HTTP_200_OK)
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.throttle = UserRateThrottle()
+        self.request = RequestFactory().post(reverse("users-reset-password"))
+        self.request.user = AnonymousUser()
+        self.view = mock.Mock(spec=["throttle_scope"], throttle_scope="password_reset") # 5/hour
+
+    def allowed(self, at):
+        # seconds into an hour-long window
+        with mock.patch("utilities.throttling.time.time", return_value=3600 * 1000 + at):
+            return self.throttle.allow_request(self.request, self.view)
+
+    def test_retrying_after_retry_after_is_allowed(self):
+        self.assertEqual([self.allowed(0) for _ in range(5)], [True] * 5)
+        self.assertFalse(self.allowed(100))
+        retry_at = 100 + self.throttle.wait()
+
+        # being refused doesn't count, so it doesn't push the wait back
+        self.assertFalse(self.allowed(200))
+        self.assertEqual(200 + self.throttle.wait(), retry_at)
+        # the first window still weighs on the next one when retry_at comes
+        self.assertGreater(retry_at, 3600)
+        self.assertFalse(self.allowed(retry_at - 1))
+        self.assertTrue(self.allowed(retry_at))
+
+    def test_retry_after_waits_for_the_previous_window_to_slide_out(self):
+        self.assertEqual([self.allowed(3000) for _ in range(5)], [True] * 5)
+        # early in the next window the previous one still counts for nearly all of its 5
+        self.assertFalse(self.allowed(3700))
+        retry_at = 3700 + self.throttle.wait()
+        self.assertLess(retry_at, 7200)
+        self.assertFalse(self.allowed(retry_at - 1))
+        self.assertTrue(self.allowed(retry_at))
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_a_view_over_its_query_budget_fails(self):
+        # the plan catalog reloads on a cold cache, which takes queries
+        with mock.patch.object(SubscriptionPlanViewSet, "query_budget", 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse("subscription-plans-list"))
+        self.assertEqual(self.client.get(reverse("subscription-plans-list")).status_code, status.HTTP_200_OK)
+
+    def test_metrics_need_the_token(self):
+        self.client.get(reverse("subscription-plans-list"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN="scraper"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer other").status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scraper")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # timed by the middleware, rendered by TimedJSONRenderer
+        text = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="/plans/",method="GET",status="200"}', text)
+        self.assertIn('http_response_render_duration_seconds_count{route="/plans/",method="GET"}', text)
+
+
+class NotificationStreamTicketTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.access = str(AccessToken.for_user(self.user))
+
+    def stream_user(self, **params):
+        return authenticate(RequestFactory().get(reverse("notification_stream"), params))
+
+    def ticket(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        response = self.client.post(reverse("users-notification-stream-ticket"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["ticket"]
+
+    def test_the_stream_is_not_served_under_wsgi(self):
+        response = self.client.get(reverse("notification_stream"), {"ticket": self.ticket()})
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_the_stream_is_served_under_asgi(self):
+        # past the ASGI check to authentication
+        response = await self.async_client.get(reverse("notification_stream"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ticket_opens_the_stream_once(self):
+        self.assertEqual(self.client.post(reverse("users-notification-stream-ticket")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        ticket = self.ticket()
+        self.assertEqual(self.stream_user(ticket=ticket), self.user)
+        self.assertIsNone(self.stream_user(ticket=ticket))
+
+    def test_access_token_is_not_taken_from_the_url(self):
+        self.assertIsNone(self.stream_user(token=self.access))
+        self.assertIsNone(self.stream_user(ticket=self.access))
+
+    def test_ticket_expires(self):
+        ticket = self.ticket()
+        later = time.time() + settings.NOTIFICATION_STREAM_TICKET_MAX_AGE + 1
+        with mock.patch("django.core.signing.time.time", return_value=later):
+            self.assertIsNone(self.stream_user(ticket=ticket))
+
+
+class SubscriptionTests(APITestCase):
+    def test_subscriptions_cannot_be_written_directly(self):
+        user = create_user()
+        basic = SubscriptionPlan.objects.create(name="Basic", price="0.00")
+        pro = SubscriptionPlan.objects.create(name="Pro", price="9.99")
+        end_date = timezone.now() + timedelta(days=3)
+        subscription = UserSubscription.objects.create(user=user, subscription_plan=basic, end_date=end_date)
+        other = create_user("someone@example.com")
+
+        self.client.force_authenticate(user)
+        fields = {"subscription_plan": str(pro.pk), "end_date": (end_date + timedelta(days=3650)).isoformat(), "user": str(other.pk)}
+        detail = reverse("user-subscription-detail", args=[subscription.pk])
+        self.assertEqual(self.client.patch(detail, fields, format="json").status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.delete(detail).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.post(reverse("user-subscription-list"), fields, format="json").status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+
+        subscription.refresh_from_db()
+        self.assertEqual((subscription.user, subscription.subscription_plan, subscription.end_date), (user, basic, end_date))
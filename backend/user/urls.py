@@ -3,14 +3,15 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
      TokenRefreshView,
      TokenVerifyView,
-     TokenBlacklistView
  )
 
-from .views import UserViewset, TokenObtainPairView, UserSubscriptionViewSet 
+from .streams import notification_stream
+from .views import UserViewset, TokenObtainPairView, TokenBlacklistView, UserSubscriptionViewSet, SubscriptionPlanViewSet
 
 router = DefaultRouter()
 router.register("users", UserViewset, basename="users")
 router.register(r'subscriptions', UserSubscriptionViewSet, basename='user-subscription')
+router.register(r'plans', SubscriptionPlanViewSet, basename='subscription-plans')
 
 
 urlpatterns = [
@@ -19,4 +20,5 @@ urlpatterns = [
      path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
      path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
      path('token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),
+     path('users/notifications/stream/', notification_stream, name='notification_stream'),
 ] + router.urls
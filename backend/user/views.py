@@ -3,17 +3,25 @@ from rest_framework import permissions
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from rest_framework_simplejwt.views import TokenObtainPairView as SimpleJWTTokenObtainPairView
+from rest_framework_simplejwt.views import TokenBlacklistView as SimpleJWTTokenBlacklistView
+from rest_framework_simplejwt.settings import api_settings
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
 
-from .models import Notification, NotificationPreference, UserSubscription, SubscriptionPlan
+from .authentication import revoke_tokens
+from . import catalog
+from .models import Feature, Notification, NotificationPreference, UserSubscription
+from .notifications import mark_read, unread_count
+from .pagination import NotificationPagination
 from .serializers import UserSerializer, TokenObtainSerializer
+from .streams import issue_ticket
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +30,11 @@ User = get_user_model()
 class UserViewset(viewsets.ModelViewSet):
     serializer_class = UserSerializer.UserRetrieveSerializer
     queryset = User.objects.all()
+    throttle_scopes = {
+        "create": "signup",
+        "reset_password": "password_reset",
+        "reset_password_complete": "password_reset",
+    }
 
     @transaction.atomic()
     def create(self, request, *args, **kwargs):
@@ -49,9 +62,7 @@ class UserViewset(viewsets.ModelViewSet):
 
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def me(self, request, *args, **kwargs):
-        user = request.user
-        profile = user.profile
-        serializer = UserSerializer.UserRetrieveSerializer(profile)
+        serializer = UserSerializer.UserRetrieveSerializer(request.user)
         return Response(data=serializer.data)
     
     @action(methods=['get'], detail=True, permission_classes=[permissions.IsAuthenticated])
@@ -87,9 +98,8 @@ class UserViewset(viewsets.ModelViewSet):
                 message = f"Hi {user.first_name},\n\nPlease click the link below to reset your \npassword:{reset_url}\n\nIf you did not request this, please ignore this email."
                 email_from = settings.DEFAULT_FROM_EMAIL
 
-                logger.info(f"Sending password reset email to: {email}")
                 user.email_user(subject, message, email_from)
-                logger.info(f"Password reset email sent successfully to: {email}")
+                logger.info(f"Password reset email queued for: {email}")
 
                 return Response({'message': 'We have sent you a link to reset your password'}, status=status.HTTP_200_OK)
             else:
@@ -145,41 +155,57 @@ class UserViewset(viewsets.ModelViewSet):
 
         return Response(data=updated_serializer.data, status=200)
 
-    @action(methods=['POST'], permission_classes=[permissions.IsAuthenticated])
+    @action(methods=['GET'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def notifications(self, request, *args, **kwargs):
-        user = request.user
-
-        notifications = user.notification_receiver.all()
-        serializer = UserSerializer.NotificationSerializer(notifications, many=True)
-        return Response(data=serializer.data)
-
-    @action(methods=['POST'], permission_classes=[permissions.IsAuthenticated])
+        """The inbox, unread first then newest first, narrowed by ?is_read=true|false."""
+        notifications = Notification.objects.filter(receiver=request.user)
+        is_read = request.query_params.get("is_read")
+        if is_read is not None:
+            notifications = notifications.filter(is_read=is_read.lower() == "true")
+
+        paginator = NotificationPagination()
+        page = paginator.paginate_queryset(notifications, request, view=self)
+        serializer = UserSerializer.NotificationSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False, url_path='notifications/unread_count', permission_classes=[permissions.IsAuthenticated])
+    def unread_notifications_count(self, request, *args, **kwargs):
+        # read from the database, request.user may come from the authentication cache
+        return Response(data=dict(unread=unread_count(request.user.pk)))
+
+    @action(methods=['POST'], detail=False, url_path='notifications/stream_ticket', permission_classes=[permissions.IsAuthenticated])
+    def notification_stream_ticket(self, request, *args, **kwargs):
+        """A one-use ticket for notifications/stream/?ticket=, which doesn't take the access token."""
+        return Response(data=dict(ticket=issue_ticket(request.user.pk), expires_in=settings.NOTIFICATION_STREAM_TICKET_MAX_AGE))
+
+    @action(methods=['POST'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def mark_all_notifications_read(self, request, *args, **kwargs):
-        user = request.user
-
-        notifications = user.notification_receiver.filter(is_read=False).update(is_read=True)
-        serializer = UserSerializer.NotificationSerializer(notifications, many=True)
-        return Response(data=serializer.data)
+        marked = mark_read(request.user.pk)
+        return Response(data=dict(marked_read=marked, unread=unread_count(request.user.pk)))
 
-    @action(methods=['POST'], permission_classes=[permissions.IsAuthenticated])
-    def mark_notification_read(self, request, *args, **kwargs):
-        user = request.user
-
-        serializer = UserSerializer.ReadNotificationSerializer(data=request.data, partial=True)
+    @action(methods=['POST'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def mark_notifications_read(self, request, *args, **kwargs):
+        serializer = UserSerializer.ReadNotificationsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        notification = user.notification_receiver.filter(id=request.data['id']).update(is_read=True)
-        serializer = UserSerializer.NotificationSerializer(notification)
-        return Response(data=serializer.data)
+        marked = mark_read(request.user.pk, serializer.validated_data["ids"])
+        return Response(data=dict(marked_read=marked, unread=unread_count(request.user.pk)))
 
 
-class UserSubscriptionViewSet(viewsets.ModelViewSet):
+class UserSubscriptionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    The user's own subscription. Its plan and end date only change through
+    upgrade_subscription and downgrade_subscription, so there's no create,
+    update or delete.
+    """
     queryset = UserSubscription.objects.all()
     serializer_class = UserSerializer.UserSubscriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return self.queryset.filter(user=self.request.user).select_related("subscription_plan").prefetch_related(
+            Prefetch("subscription_plan__features", queryset=Feature.objects.order_by("name"))
+        )
 
     @action(detail=False, methods=['get'])
     def view_subscription(self, request):
@@ -202,10 +228,8 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
         if not current_subscription:
             return Response({"detail": "No current subscription found."}, status=404)
 
-        new_plan_id = request.data.get('new_plan_id')
-        try:
-            new_plan = SubscriptionPlan.objects.get(id=new_plan_id)
-        except SubscriptionPlan.DoesNotExist:
+        new_plan = catalog.get_plan(request.data.get('new_plan_id'))
+        if new_plan is None:
             return Response({"detail": "The requested plan does not exist."}, status=400)
 
         if new_plan.price <= current_subscription.subscription_plan.price:
@@ -213,7 +237,7 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
 
         current_subscription.subscription_plan = new_plan
         current_subscription.end_date = timezone.now() + timezone.timedelta(days=30)  # Recalculate end date
-        current_subscription.save()
+        current_subscription.save(update_fields=["subscription_plan", "end_date", "updated_at"])
 
         serializer = self.get_serializer(current_subscription)
         return Response(serializer.data)
@@ -229,10 +253,8 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
             return Response({"detail": "No current subscription found."}, status=404)
 
         # Fetch the new plan from the request
-        new_plan_id = request.data.get('new_plan_id')
-        try:
-            new_plan = SubscriptionPlan.objects.get(id=new_plan_id)
-        except SubscriptionPlan.DoesNotExist:
+        new_plan = catalog.get_plan(request.data.get('new_plan_id'))
+        if new_plan is None:
             return Response({"detail": "The requested plan does not exist."}, status=400)
 
         if new_plan.price >= current_subscription.subscription_plan.price:
@@ -240,13 +262,34 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
 
         current_subscription.subscription_plan = new_plan
         current_subscription.end_date = timezone.now() + timezone.timedelta(days=30)
-        current_subscription.save()
+        current_subscription.save(update_fields=["subscription_plan", "end_date", "updated_at"])
 
         serializer = self.get_serializer(current_subscription)
         return Response(serializer.data)
 
+class SubscriptionPlanViewSet(viewsets.ViewSet):
+    """Public plan listing, served from the in-process plan catalog."""
+    permission_classes = [permissions.AllowAny]
+    query_budget = 2 # a catalog reload, zero queries otherwise
+
+    def list(self, request, *args, **kwargs):
+        return Response(data=catalog.get_catalog().data)
+
 class TokenObtainPairView(SimpleJWTTokenObtainPairView):
      serializer_class = TokenObtainSerializer
+     throttle_scope = "login"
  
      def post(self, request, *args, **kwargs) -> Response:
-         return super().post(request, *args, **kwargs)
\ No newline at end of file
+         return super().post(request, *args, **kwargs)
+
+
+class TokenBlacklistView(SimpleJWTTokenBlacklistView):
+    """Logout, besides blacklisting the refresh token the user's access tokens stop working."""
+
+    def post(self, request, *args, **kwargs) -> Response:
+        response = super().post(request, *args, **kwargs)
+        # the token was valid to get this far, it's blacklisted now so skip verifying it again
+        user_id = RefreshToken(request.data["refresh"], verify=False).get(api_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            revoke_tokens(user_id)
+        return response
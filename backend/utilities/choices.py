@@ -8,14 +8,32 @@ class GenderType(models.TextChoices):
 
 
 class NotificationType(models.TextChoices):
-    pass
+    EVENT_REGISTRATION = "EVENT_REGISTRATION", _("Event registration")
+    EVENT_REMINDER = "EVENT_REMINDER", _("Event reminder")
+    NEW_EVENT_NEARBY = "NEW_EVENT_NEARBY", _("New event nearby")
 
 
 class EventRegistrationStatusType(models.TextChoices):
     CANCELLED = "CANCELLED", _("CANCELLED")
     CONFIRMED = "CONFIRMED", _("CONFIRMED")
+    WAITLISTED = "WAITLISTED", _("WAITLISTED")
+
+
+class RollupGranularityType(models.TextChoices):
+    HOURLY = "HOURLY", _("Hourly")
+    DAILY = "DAILY", _("Daily")
+
+
+class EmailStatusType(models.TextChoices):
+    PENDING = "PENDING", _("Pending")
+    SENT = "SENT", _("Sent")
+    FAILED = "FAILED", _("Failed")
 
 
 class SubscriptionPlanType(models.TextChoices):
     MONTHLY = "MONTHLY"
-    YEARLY = "YEARLY"
\ No newline at end of file
+    YEARLY = "YEARLY"
+
+
+class FeatureType(models.TextChoices):
+    PAID_EVENTS = "PAID_EVENTS", _("Paid events")
@@ -0,0 +1,131 @@
+import math
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+from utilities.utils import next_prefix
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point; points sharing a prefix sit in the same cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        interval, value = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) around a circle, longitudes may fall outside ±180."""
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angle)
+    if latitude + lat_delta >= 90.0 or latitude - lat_delta <= -90.0 or angle >= math.pi / 2:
+        # the circle takes in a pole, and with it every longitude
+        lng_delta = 180.0
+    else:
+        # the widest point of the circle is at the meridians tangent to it, not at its centre's latitude
+        lng_delta = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    return (
+        max(-90.0, latitude - lat_delta),
+        min(90.0, latitude + lat_delta),
+        longitude - lng_delta,
+        longitude + lng_delta,
+    )
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=16):
+    """
+    The geohash prefixes, as long as possible while needing at most
+    `max_cells` of them, whose cells together cover the circle.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        columns = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * columns <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    lat = min_lat
+    while True:
+        lng = min_lng
+        while True:
+            wrapped_lng = (lng + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, wrapped_lng, precision))
+            if lng >= max_lng:
+                break
+            lng = min(lng + width, max_lng)
+        if lat >= max_lat:
+            break
+        lat = min(lat + height, max_lat)
+    return sorted(cells)
+
+
+def next_cell(cell):
+    """The first geohash after every one starting with `cell`, or None when there is none."""
+    return next_prefix(cell, GEOHASH_ALPHABET)
+
+
+def within_cells(cells, field="geohash"):
+    """
+    Filter on the geohash prefixes, written as ranges rather than `startswith`
+    since LIKE can't use a plain btree index. Neighbouring cells are merged
+    into a single range, which keeps the number of index scans down.
+    """
+    ranges = []
+    for cell in sorted(cells):
+        if ranges:
+            first, last = ranges[-1]
+            if len(cell) == len(last) and cell[:-1] == last[:-1] and GEOHASH_ALPHABET.index(cell[-1]) == GEOHASH_ALPHABET.index(last[-1]) + 1:
+                ranges[-1] = (first, cell)
+                continue
+        ranges.append((cell, cell))
+
+    query = Q()
+    for first, last in ranges:
+        # everything under `last` sorts before the cell right after it
+        upper = next_cell(last)
+        bounds = {f"{field}__gte": first}
+        if upper is not None:
+            bounds[f"{field}__lt"] = upper
+        query |= Q(**bounds)
+    return query
+
+
+def distance_expression(latitude, longitude, latitude_field="latitude", longitude_field="longitude"):
+    """Great-circle (haversine) distance in km from a point, as a database expression."""
+    lat = Radians(Value(latitude, output_field=FloatField()))
+    lng = Radians(Value(longitude, output_field=FloatField()))
+    delta_lat = Radians(F(latitude_field)) - lat
+    delta_lng = Radians(F(longitude_field)) - lng
+    a = Power(Sin(delta_lat / 2), 2) + Cos(lat) * Cos(Radians(F(latitude_field))) * Power(Sin(delta_lng / 2), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
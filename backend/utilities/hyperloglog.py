@@ -0,0 +1,48 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    Approximate distinct counter.
+
+    With the default precision of 10 the sketch is 1024 one-byte registers
+    (stored as-is in a BinaryField) and estimates are within ~3% of the
+    true count. Sketches merge losslessly, so hourly sketches can be
+    combined into daily or lifetime unique counts.
+    """
+
+    def __init__(self, precision=10, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, data, precision=10):
+        return cls(precision=precision, registers=data or None)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # linear counting is far more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from utilities.utils import get_client_ip
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def idempotent(view_method):
+    """
+    Replay the stored response when a client retries a request with the same
+    Idempotency-Key header, instead of running the view again. Reusing a key
+    with a different body is rejected, as is a retry that arrives while the
+    first attempt is still running. Keys are scoped to the client, the user
+    or else the address the throttles count it under, so another client
+    sending the same key neither collides with it nor gets its response.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        client = f"user:{request.user.pk}" if request.user.is_authenticated else f"ip:{get_client_ip(request)}"
+        scope = hashlib.sha256(f"{client}:{request.path}:{key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+        response_key = f"idempotency:{scope}"
+        lock_key = f"idempotency-lock:{scope}"
+
+        stored = cache.get(response_key)
+        if stored is None:
+            if not cache.add(lock_key, 1, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return Response({"detail": "A request with this Idempotency-Key is already in progress."}, status=status.HTTP_409_CONFLICT)
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(
+                        response_key,
+                        dict(fingerprint=fingerprint, status=response.status_code, data=response.data),
+                        settings.IDEMPOTENCY_KEY_TTL,
+                    )
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        if stored["fingerprint"] != fingerprint:
+            return Response({"detail": "This Idempotency-Key was already used with a different request body."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(data=stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+    return wrapper
@@ -0,0 +1,232 @@
+import bisect
+import hmac
+import logging
+import re
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+NAMED_GROUP_RE = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Histogram:
+    """A Prometheus histogram, one set of cumulative buckets per label set."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                # one count per bucket, then +Inf, sum
+                counts = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: list(counts) for labels, counts in self.series.items()}
+        for labels, counts in sorted(series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {counts[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            lines.append(f"{self.name}_total{{{label_text}}} {value}")
+        return lines
+
+
+request_duration = Histogram("http_request_duration_seconds", "Time spent handling the request.", ("route", "method", "status"), LATENCY_BUCKETS)
+request_queries = Histogram("http_request_db_queries", "Database queries run per request.", ("route", "method"), QUERY_COUNT_BUCKETS)
+request_query_duration = Histogram("http_request_db_duration_seconds", "Time spent in database queries per request.", ("route", "method"), LATENCY_BUCKETS)
+response_render_duration = Histogram("http_response_render_duration_seconds", "Time spent rendering the response body.", ("route", "method"), LATENCY_BUCKETS)
+query_budget_exceeded = Counter("http_request_query_budget_exceeded", "Requests that ran more queries than METRICS_QUERY_BUDGET.", ("route", "method"))
+REGISTRY = (request_duration, request_queries, request_query_duration, response_render_duration, query_budget_exceeded)
+
+# the measurements of the request being handled, None outside of one
+current_request = ContextVar("current_request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.query_duration = 0.0
+        self.render_duration = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    `connection.execute_wrapper` hook installed on every connection, counts
+    and times the queries of the request being handled. The request is
+    found through a context variable rather than by wrapping the request's
+    connections, so queries of async requests, which run on other threads'
+    connections, are counted too.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.query_duration += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@sync_and_async_middleware
+class MetricsMiddleware:
+    """
+    Record latency, query count and time and render time per route, exposed
+    by `metrics_view`. Routes are the URL patterns, not the paths, to keep the
+    number of series bounded.
+
+    Requests running more than METRICS_QUERY_BUDGET queries are logged, or
+    raise QueryBudgetExceeded with METRICS_QUERY_BUDGET_STRICT, which is how
+    tests catch N+1 regressions. A view can set its own `query_budget`.
+
+    Supports async mode too, so under ASGI async views, like the live
+    streams, stay on the event loop instead of being adapted to a thread.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # connections opened before this module was imported never sent connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, metrics, time.perf_counter() - start)
+
+    def record(self, request, response, metrics, duration):
+        match = getattr(request, "resolver_match", None)
+        route = self.route(match)
+        labels = (route, request.method)
+        request_duration.observe((*labels, str(response.status_code)), duration)
+        request_queries.observe(labels, metrics.queries)
+        request_query_duration.observe(labels, metrics.query_duration)
+        if metrics.render_duration:
+            response_render_duration.observe(labels, metrics.render_duration)
+
+        budget = self.query_budget(match)
+        if budget is not None and metrics.queries > budget:
+            query_budget_exceeded.inc(labels)
+            message = f"{request.method} {route} ran {metrics.queries} queries, over its budget of {budget}."
+            if settings.METRICS_QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def route(self, match):
+        """The URL pattern that matched, router regexes tidied up: /events/<pk>/."""
+        if match is None:
+            return "unmatched"
+        return "/" + NAMED_GROUP_RE.sub(r"<\1>", match.route).replace("^", "").replace("$", "")
+
+    def query_budget(self, match):
+        view_class = getattr(match.func, "cls", None) if match else None
+        return getattr(view_class, "query_budget", settings.METRICS_QUERY_BUDGET)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its render time to MetricsMiddleware."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics = current_request.get()
+            if metrics is not None:
+                metrics.render_duration += time.perf_counter() - start
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of this process' metrics, to scrapes sending
+    METRICS_TOKEN as a bearer token. Refused to everyone while it's unset,
+    the routes and their traffic aren't for the public.
+    """
+    sent = request.headers.get("Authorization", "").encode()
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(sent, f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return HttpResponseForbidden()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
@@ -0,0 +1,32 @@
+from django.db import models
+
+
+def compact_uuid_keys(apps, schema_editor):
+    """
+    Rewrite `BaseModelMixin` keys stored as dashed 36 char strings into the
+    32 char hex form `UUIDField` uses on backends without a native uuid type.
+
+    Run it with `migrations.RunPython(compact_uuid_keys, migrations.RunPython.noop)`
+    right after the `AlterField` operations that turn the `id` CharFields into
+    UUIDFields. PostgreSQL casts the column with `USING id::uuid` during the
+    ALTER itself, so there is nothing to rewrite there.
+    """
+    connection = schema_editor.connection
+    if connection.features.has_native_uuid_field:
+        return
+
+    quote = schema_editor.quote_name
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.proxy or not model._meta.managed:
+            continue
+
+        columns = [
+            field.column for field in model._meta.concrete_fields
+            if isinstance(field, models.UUIDField)
+            or (field.is_relation and isinstance(field.target_field, models.UUIDField))
+        ]
+        if not columns:
+            continue
+
+        assignments = ", ".join(f"{quote(column)} = REPLACE({quote(column)}, '-', '')" for column in columns)
+        schema_editor.execute(f"UPDATE {quote(model._meta.db_table)} SET {assignments}")
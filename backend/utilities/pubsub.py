@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from functools import wraps
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PUSH_SETTINGS = {
+    "BROKER": "utilities.pubsub.LocalBroker",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "HEARTBEAT_INTERVAL": 15,
+    "MAX_PENDING": 100,
+    "RECONNECT_DELAY": 1,
+    "MAX_RECONNECT_DELAY": 30,
+}
+
+
+def push_settings():
+    return {**DEFAULT_PUSH_SETTINGS, **getattr(settings, "PUSH", {})}
+
+
+class Subscription:
+    """
+    Messages published to some channels, for one connected client. Lives on
+    the event loop it was created on, publishers hand messages over from any
+    thread.
+    """
+
+    def __init__(self, broker, channels, max_pending):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_pending)
+        self.dropped = 0
+
+    def deliver(self, channel, message):
+        try:
+            self.queue.put_nowait((channel, message))
+        except asyncio.QueueFull:
+            # a client this far behind gets the latest state on reconnect, don't buffer without bound for it
+            self.dropped += 1
+
+    async def get(self, timeout):
+        """The next (channel, message), None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Pub/sub between the threads and event loop of one process."""
+
+    def __init__(self, **kwargs):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, *channels, max_pending=None):
+        """Must be called from the event loop the subscription will be read on."""
+        subscription = Subscription(self, channels, max_pending or push_settings()["MAX_PENDING"])
+        with self.lock:
+            for channel in channels:
+                self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+    def has_subscribers(self, channel):
+        """Lets publishers skip building messages nobody would receive."""
+        return channel in self.subscriptions
+
+    def publish(self, channel, message):
+        self.publish_many([(channel, message)])
+
+    def publish_many(self, messages):
+        """Deliver (channel, message) pairs, one hand-off per event loop however many subscribers."""
+        by_loop = defaultdict(list)
+        with self.lock:
+            for channel, message in messages:
+                for subscription in self.subscriptions.get(channel, ()):
+                    by_loop[subscription.loop].append((subscription, channel, message))
+
+        for loop, deliveries in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, deliveries)
+            except RuntimeError:
+                # the loop closed under us, its subscriptions are gone with it
+                pass
+
+
+def _deliver_all(deliveries):
+    for subscription, channel, message in deliveries:
+        subscription.deliver(channel, message)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis so subscribers connected to any worker receive
+    the message. Each process holds a single Redis subscription, on a
+    listener thread, and fans the messages out to its local subscribers.
+    """
+
+    prefix = "eventhub:push:"
+
+    def __init__(self, redis_url=None, **kwargs):
+        import redis
+
+        super().__init__()
+        self.client = redis.Redis.from_url(redis_url)
+        self.listener = None
+
+    def subscribe(self, *channels, max_pending=None):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="push-listener", daemon=True)
+                self.listener.start()
+        return super().subscribe(*channels, max_pending=max_pending)
+
+    def has_subscribers(self, channel):
+        # they may be connected to another worker
+        return True
+
+    def publish_many(self, messages):
+        pipeline = self.client.pipeline(transaction=False)
+        for channel, message in messages:
+            pipeline.publish(f"{self.prefix}{channel}", json.dumps(message, cls=DjangoJSONEncoder))
+        pipeline.execute()
+
+    def listen(self):
+        """
+        Relay the Redis messages, reconnecting with a growing delay whenever the
+        connection drops. What's published meanwhile is lost, clients get the
+        latest state when they reconnect anyway.
+        """
+        import redis
+
+        config = push_settings()
+        delay = config["RECONNECT_DELAY"]
+        try:
+            while True:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.psubscribe(f"{self.prefix}*")
+                    delay = config["RECONNECT_DELAY"]
+                    for item in pubsub.listen():
+                        self.relay(item)
+                except (redis.ConnectionError, redis.TimeoutError) as error:
+                    logger.warning(f"Lost the push subscription, reconnecting in {delay} s: {error}")
+                finally:
+                    pubsub.close()
+                time.sleep(delay)
+                delay = min(delay * 2, config["MAX_RECONNECT_DELAY"])
+        finally:
+            # anything else ended the thread, the next subscribe starts another
+            with self.lock:
+                self.listener = None
+
+    def relay(self, item):
+        try:
+            channel = item["channel"].decode()[len(self.prefix):]
+            super().publish_many([(channel, json.loads(item["data"]))])
+        except Exception:
+            logger.exception("Dropped a malformed push message.")
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = push_settings()
+                _broker = import_string(config["BROKER"])(redis_url=config["REDIS_URL"])
+    return _broker
+
+
+def _call(func, args):
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args):
+    """
+    Await blocking `func`, e.g. ORM calls, from a stream view. Unlike plain
+    `sync_to_async` it runs on the shared executor instead of a thread that
+    belongs to the request and lives as long as the stream stays open.
+    """
+    return await sync_to_async(_call, thread_sensitive=False)(func, args)
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _stream(channels, initial):
+    # subscribing here rather than in the view puts the subscription on the loop that serves the response
+    subscription = get_broker().subscribe(*channels)
+    heartbeat = push_settings()["HEARTBEAT_INTERVAL"]
+    try:
+        for event, data in initial:
+            yield sse_message(event, data)
+        while True:
+            item = await subscription.get(timeout=heartbeat)
+            if item is None:
+                # keeps proxies from timing the idle connection out
+                yield ": ping\n\n"
+                continue
+            _, message = item
+            yield sse_message(message["event"], message["data"])
+    finally:
+        subscription.close()
+
+
+def sse_response(channels, initial=()):
+    """
+    A Server-Sent Events response relaying the messages published to
+    `channels`, each a dict with "event" and "data", after the `initial`
+    (event, data) pairs. Only for ASGI requests, see `asgi_only`.
+    """
+    response = StreamingHttpResponse(_stream(channels, initial), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def asgi_only(view):
+    """
+    Answer 501 to the requests of a stream view that didn't come through the
+    ASGI application. Under WSGI Django reads an async streaming response to
+    the end before sending any of it, which an endless stream never reaches.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(dict(detail="Streams are only served through the ASGI application."), status=501)
+        return await view(request, *args, **kwargs)
+
+    return wrapper
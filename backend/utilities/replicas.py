@@ -0,0 +1,119 @@
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = "db_primary"
+
+
+class Routing:
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+# the routing of the request being handled, None outside of one
+current_routing = ContextVar("current_database_routing", default=None)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. data about to outlive the replicas' lag in a cache."""
+    routing = current_routing.get()
+    if routing is None or not routing.replica_reads:
+        yield
+        return
+    routing.replica_reads = False
+    try:
+        yield
+    finally:
+        routing.replica_reads = not routing.wrote
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes, and reads by default, go to the primary. Reads of the requests
+    `ReplicaRoutingMiddleware` lets onto DATABASE_REPLICAS go to one of
+    them, until the request writes or opens a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or not routing.replica_reads or not settings.DATABASE_REPLICAS:
+            return None
+        # a transaction must read its own writes
+        if connections["default"].in_atomic_block:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            # the rest of the request reads what it wrote
+            routing.replica_reads = False
+            routing.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # replicas get the schema through replication
+        return db not in settings.DATABASE_REPLICAS
+
+
+@sync_and_async_middleware
+class ReplicaRoutingMiddleware:
+    """
+    Let the reads of read-only viewset actions listed in the view's
+    `replica_actions` go to the replicas. A client that wrote is kept on the
+    primary for DATABASE_REPLICA_PIN_SECONDS through a cookie, long enough
+    for the replicas to catch up, so it always reads its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = Routing()
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(routing, response)
+
+    async def __acall__(self, request):
+        routing = Routing()
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(routing, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        if routing is None or request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return None
+        view_class = getattr(view_func, "cls", None)
+        action = (getattr(view_func, "actions", None) or {}).get(request.method.lower())
+        routing.replica_reads = action in getattr(view_class, "replica_actions", ())
+        return None
+
+    def pin(self, routing, response):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
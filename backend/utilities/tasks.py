@@ -0,0 +1,47 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASK_WORKERS,
+                    thread_name_prefix="eventhub-task",
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {func.__name__} failed.")
+    finally:
+        close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Local stand-in for a task queue: run `func` on a worker thread so the
+    request doesn't wait for it. With BACKGROUND_TASKS_EAGER set (tests,
+    management commands) the task runs inline instead.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        return func(*args, **kwargs)
+    return get_executor().submit(_run, func, args, kwargs)
+
+
+def run_on_commit(func, *args, **kwargs):
+    """Queue `func` once the current transaction commits, so the worker sees its rows."""
+    transaction.on_commit(lambda: run_in_background(func, *args, **kwargs))
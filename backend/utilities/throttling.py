@@ -0,0 +1,99 @@
+import math
+import time
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """"5/hour" -> (5, 3600), same format as DRF's own throttles."""
+    num, period = rate.split("/")
+    return int(num), DURATIONS[period[0]]
+
+
+class SlidingWindowRateThrottle(BaseThrottle):
+    """
+    Sliding window counter throttle, a cheaper stand-in for DRF's
+    SimpleRateThrottle, which keeps every request timestamp in one cache entry
+    and read-modify-writes it (racy across workers).
+
+    Requests are counted in fixed windows with an atomic cache increment and
+    the previous window's count is weighted by how much of it still overlaps
+    the sliding window, so a check costs two cache calls.
+
+    The rate comes from DEFAULT_THROTTLE_RATES, keyed by the view's scope:
+    `throttle_scopes[view.action]` on viewsets, `throttle_scope` otherwise.
+    Views without a scope aren't throttled. Clients are told apart by
+    BaseThrottle.get_ident, which reads X-Forwarded-For only as far as the
+    NUM_PROXIES trusted proxies in front of the app.
+    """
+    rate_suffix = ""
+
+    def get_scope(self, view):
+        scopes = getattr(view, "throttle_scopes", None)
+        if scopes is not None:
+            return scopes.get(getattr(view, "action", None))
+        return getattr(view, "throttle_scope", None)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}{self.rate_suffix}") if scope else None
+        if rate is None:
+            return True
+
+        self.num_requests, self.duration = parse_rate(rate)
+        now = time.time()
+        window = int(now // self.duration)
+        key = f"throttle:{scope}{self.rate_suffix}:{self.get_ident(request)}"
+
+        current_key = f"{key}:{window}"
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # first request of the window, add() so concurrent first requests don't reset each other
+            cache.add(current_key, 0, self.duration * 2)
+            current = cache.incr(current_key)
+        previous = cache.get(f"{key}:{window - 1}", 0)
+
+        self.elapsed = now % self.duration
+        self.previous = previous
+        allowed = previous * (1 - self.elapsed / self.duration) + current <= self.num_requests
+        if not allowed:
+            # only allowed requests count, a client retrying while refused doesn't push its wait back
+            cache.decr(current_key)
+            current -= 1
+        self.current = current
+        return allowed
+
+    def wait(self):
+        """Seconds until a request would be allowed, assuming none is made meanwhile."""
+        room = self.num_requests - 1 # what may already be counted for the retry to fit
+        remaining = self.duration - self.elapsed
+        if self.current <= room and self.previous:
+            # the previous window sliding out of this one may free enough before it ends
+            slide = (1 - (room - self.current) / self.previous) * self.duration - self.elapsed
+            if slide < remaining:
+                return max(0, math.ceil(slide))
+        # otherwise in the next window, where this window's count is the previous one
+        if self.current <= room:
+            return math.ceil(remaining)
+        return math.ceil(remaining + (1 - room / self.current) * self.duration)
+
+
+class UserRateThrottle(SlidingWindowRateThrottle):
+    """Counts per user, anonymous requests per client IP."""
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return super().get_ident(request)
+
+
+class IPRateThrottle(SlidingWindowRateThrottle):
+    """
+    Counts per client IP whoever is logged in, under the scope's "<scope>_ip"
+    rate, a looser cap on one address cycling through accounts.
+    """
+    rate_suffix = "_ip"
@@ -1,14 +1,68 @@
+import os
+import time
 import uuid
 from django.db import models
+from rest_framework.throttling import BaseThrottle
 
 
 def generate_uuid():
-    return str(uuid.uuid4())
+    """
+    UUIDv7: a 48 bit millisecond timestamp followed by random bits, so new
+    keys land at the right edge of primary key and foreign key indexes
+    instead of splitting random pages.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (timestamp_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | (random_bits >> 68) << 64
+        | 0b10 << 62
+        | random_bits & ((1 << 62) - 1)
+    )
+    return uuid.UUID(int=value)
+
+
+def get_client_ip(request):
+    """
+    The address the throttles count the client under. The left-most
+    X-Forwarded-For entry is whatever the client sent, so only the entries
+    added by the NUM_PROXIES trusted proxies are read.
+    """
+    return BaseThrottle().get_ident(request)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def next_prefix(prefix, alphabet):
+    """
+    The first string after every one starting with `prefix`, for the upper
+    bound of a range scan, or None when there is none. Ends in a character of
+    `alphabet`, which must be listed in sort order, so the bound sorts the
+    same way under any collation the column might have.
+    """
+    while prefix:
+        position = alphabet.find(prefix[-1])
+        if 0 <= position < len(alphabet) - 1:
+            return prefix[:-1] + alphabet[position + 1]
+        # "9z" is followed by "b", not by whatever comes after "z", and a character
+        # outside the alphabet leaves the looser bound of the prefix before it
+        prefix = prefix[:-1]
+    return None
 
 
 class BaseModelMixin(models.Model):
 
-    id = models.CharField(max_length=300, unique=True, db_index=True, primary_key=True, editable=False, default=generate_uuid)
+    id = models.UUIDField(primary_key=True, editable=False, default=generate_uuid)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
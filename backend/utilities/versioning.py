@@ -0,0 +1,24 @@
+import time
+from django.core.cache import cache
+
+
+def get_version(key):
+    """
+    The version number kept in the shared cache under `key`, for building the
+    keys of entries that a `bump_version` should make stale all at once.
+    """
+    version = cache.get(key)
+    if version is None:
+        # seeded from the clock so an evicted version never comes back as a
+        # number that older entries were stored under
+        cache.add(key, time.time_ns() // 1_000_000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted, a fresh seed is newer than whatever it was
+        get_version(key)